@@ -1,89 +1,138 @@
-from flask import Flask, render_template, request, redirect, url_for, session
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify
+import click
 import os
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-import base64
-import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from diary_index import DiaryIndex, entry_year, index_entry, paginate
+from search_index import SearchIndex, diary_text, matches, search_terms
+from storage import FileStore, SegmentStore, copy_diaries, make_diary_id, normalize_id, open_store
+from vault import Vault, forget_keys, is_legacy
+
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
 DATA_DIR = 'data'
+# 1ページに表示する日記の件数
+PAGE_SIZE = 30
+MAX_PAGE_SIZE = 100
+# 検索結果として表示する日記の最大件数
+SEARCH_LIMIT = 50
+# 復号に使うスレッド数（PBKDF2とAESの処理中はGILが解放されるので、CPUコア数まで並列に動く）
+DECRYPT_WORKERS = int(os.environ.get('DECRYPT_WORKERS', os.cpu_count() or 4))
+# 日記の保存形式（files: 1件1ファイル、segments: 年ごとのセグメントファイル）
+DIARY_STORAGE = os.environ.get('DIARY_STORAGE', 'files')
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
+vault = Vault(DATA_DIR)
+store = open_store(DIARY_STORAGE, DATA_DIR)
+diary_index = DiaryIndex(DATA_DIR, vault)
+search_index = SearchIndex(DATA_DIR, vault)
+decrypt_pool = ThreadPoolExecutor(max_workers=DECRYPT_WORKERS, thread_name_prefix='decrypt')
 
-# パスワードからキーを生成する関数
-def get_key(password, salt):
-    kdf = PBKDF2HMAC(
-        algorithm=hashes.SHA256(),
-        length=32,
-        salt=salt,
-        iterations=100000,
-    )
-    key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
-    return key
-
-# 暗号化関数
+# 暗号化関数（保管庫の鍵で暗号化するので、鍵の導出はログイン中に一度だけ）
 def encrypt_data(data, password):
-    salt = os.urandom(16)
-    key = get_key(password, salt)
-    f = Fernet(key)
-    encrypted_data = f.encrypt(json.dumps(data).encode())
-    return salt + encrypted_data
-
-# 復号関数
-def decrypt_data(encrypted_data_with_salt, password):
+    return vault.encrypt(data, password)
+
+# 復号関数（旧形式のファイルも復号できる）
+def decrypt_data(encrypted_data, password):
+    try:
+        return vault.decrypt(encrypted_data, password)
+    except Exception:
+        return None
+
+# 日記を1件読み込んで復号する（日記がないか、復号できない場合は None）
+def read_diary(diary_id, password):
+    encrypted_data = store.read(diary_id)
+    if encrypted_data is None:
+        return None
+    return decrypt_data(encrypted_data, password)
+
+# 複数の日記をスレッドで並列に復号する（結果の順番は diary_ids と同じ）
+def decrypt_diaries(diary_ids, password):
+    return list(decrypt_pool.map(lambda diary_id: read_diary(diary_id, password), diary_ids))
+
+# すべての日記を復号して (ID, 日記) の組を返す（索引を作るときに使う）
+def read_all_diaries(password):
+    diaries = []
+    diary_ids = store.list_ids()
+    for diary_id, decrypted_data in zip(diary_ids, decrypt_diaries(diary_ids, password)):
+        if decrypted_data is None:
+            raise ValueError(f'日記を復号できませんでした: {diary_id}')
+        diaries.append((diary_id, decrypted_data))
+    return diaries
+
+# 一覧用の索引の項目を作る（索引がまだないときに使う）
+def build_index_entries(password):
+    return [index_entry(diary_id, data) for diary_id, data in read_all_diaries(password)]
+
+# 検索用の索引の元になる (ID, 文字列) の組を作る（索引がまだないときに使う）
+def build_search_items(password):
+    return [(diary_id, diary_text(data)) for diary_id, data in read_all_diaries(password)]
+
+# 索引を読み込む（復号できない場合は None）
+def load_diary_index(password):
     try:
-        salt = encrypted_data_with_salt[:16]
-        encrypted_data = encrypted_data_with_salt[16:]
-        key = get_key(password, salt)
-        f = Fernet(key)
-        decrypted_data = f.decrypt(encrypted_data)
-        return json.loads(decrypted_data.decode())
+        return diary_index.load_or_build(password, build_index_entries)
     except Exception:
         return None
 
-# すべての日記ファイルのパスを取得するヘルパー関数
-def get_all_diary_files():
-    all_files = []
-    for root, _, files in os.walk(DATA_DIR):
-        for file in files:
-            if file.endswith('.encrypted'):
-                all_files.append(os.path.join(root, file))
-    return all_files
+# 日記を1件復号してパスワードを確かめる（確認用の値がない保管庫で使う）
+def check_password_with_diary(password):
+    if diary_index.exists():
+        try:
+            diary_index.load(password)
+            return True
+        except Exception:
+            return False
+    for diary_id in store.list_ids():
+        return read_diary(diary_id, password) is not None
+    # 日記がまだない場合は、どんなパスワードでも受け入れる
+    return True
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     error = request.args.get('error')
     if request.method == 'POST':
         password = request.form['password']
-        
-        all_diary_files = get_all_diary_files()
-        
-        if all_diary_files:
-            try:
-                # 最新のファイルで試す
-                latest_file = max(all_diary_files, key=os.path.getctime)
-                with open(latest_file, 'rb') as f:
-                    encrypted_data = f.read()
-                if decrypt_data(encrypted_data, password) is not None:
-                    session['password'] = password
-                    return redirect(url_for('index'))
-                else:
-                    return render_template('login.html', error='パスワードが間違っています。')
-            except Exception:
-                 return render_template('login.html', error='パスワードの検証中にエラーが発生しました。')
-        # 日記がまだない場合は、どんなパスワードでも受け入れる
+
+        # 確認用の値があれば、日記の件数に関係なく鍵の導出1回で確かめられる
+        if vault.has_verifier():
+            if vault.verify_password(password):
+                session['password'] = password
+                return redirect(url_for('index'))
+            return render_template('login.html', error='パスワードが間違っています。')
+
+        # 以前のバージョンで作った保管庫や新しい保管庫では、確かめたあとで確認用の値を作る
+        try:
+            if not check_password_with_diary(password):
+                return render_template('login.html', error='パスワードが間違っています。')
+            vault.set_verifier(password)
+        except Exception:
+            return render_template('login.html', error='パスワードの検証中にエラーが発生しました。')
         session['password'] = password
         return redirect(url_for('index'))
     return render_template('login.html', error=error)
 
 @app.route('/logout')
 def logout():
-    session.pop('password', None)
+    password = session.pop('password', None)
+    if password:
+        # 導出した鍵をメモリに残さない（同じパスワードの別のセッションは、次のリクエストで導出し直す）
+        forget_keys(password)
     return redirect(url_for('login'))
 
+# 索引の項目に対応する日記本体を復号する（復号できない日記があれば None）
+def read_diaries(entries, password):
+    # 索引を作ったあとで削除された日記は飛ばす
+    entries = [entry for entry in entries if store.exists(entry['id'])]
+    diary_ids = [entry['id'] for entry in entries]
+    diaries = []
+    for entry, decrypted_data in zip(entries, decrypt_diaries(diary_ids, password)):
+        if not decrypted_data:
+            return None
+        diaries.append({'data': decrypted_data, 'id': entry['id']})
+    return diaries
+
 @app.route('/')
 def index():
     if 'password' not in session:
@@ -91,45 +140,96 @@ def index():
 
     password = session['password']
     diaries = []
-    
-    # 年のリストを取得
-    try:
-        years = sorted([d for d in os.listdir(DATA_DIR) if os.path.isdir(os.path.join(DATA_DIR, d))], reverse=True)
-    except FileNotFoundError:
-        years = []
+    next_cursor = None
+
+    # 並び順と年のリストは索引から作る（日記本体の復号は表示する1ページ分だけ）
+    entries = load_diary_index(password)
+    if entries is None:
+        return redirect(url_for('login', error='データの復号に失敗しました。再度ログインしてください。'))
+    years = sorted({entry_year(entry) for entry in entries}, reverse=True)
 
     selected_year = request.args.get('year')
-    display_title = ""
+    cursor = request.args.get('cursor')
+    display_title = f"{selected_year}年の日記" if selected_year else "最新の日記"
 
     try:
-        all_diary_files = get_all_diary_files()
-        
-        if selected_year:
-            # 年が指定されている場合、その年のファイルのみを対象にする
-            display_title = f"{selected_year}年の日記"
-            target_files = [f for f in all_diary_files if f.startswith(os.path.join(DATA_DIR, selected_year))]
-            sorted_files = sorted(target_files, key=os.path.getctime, reverse=True)
-        else:
-            # 年が指定されていない場合、最新30件を表示
-            display_title = "最新30件の日記"
-            sorted_files = sorted(all_diary_files, key=os.path.getctime, reverse=True)
-            sorted_files = sorted_files[:30]
-
-        for filename in sorted_files:
-            with open(filename, 'rb') as f:
-                encrypted_data = f.read()
-            decrypted_data = decrypt_data(encrypted_data, password)
-            if decrypted_data:
-                # IDとしてdataディレクトリからの相対パスを使用
-                diary_id = os.path.relpath(filename, DATA_DIR)
-                diaries.append({'data': decrypted_data, 'id': diary_id})
-            else:
-                return redirect(url_for('login', error='データの復号に失敗しました。再度ログインしてください。'))
+        page, next_cursor = paginate(entries, selected_year, cursor, PAGE_SIZE)
+        diaries = read_diaries(page, password)
+        if diaries is None:
+            return redirect(url_for('login', error='データの復号に失敗しました。再度ログインしてください。'))
     except Exception as e:
         print(f"日記の読み込み中にエラーが発生しました: {e}")
-        pass
+        diaries = []
+
+    return render_template('index.html', diaries=diaries, years=years, display_title=display_title,
+                           selected_year=selected_year, next_cursor=next_cursor)
+
+# スクロールに合わせて次のページの日記を返すAPI
+@app.route('/api/diaries')
+def api_diaries():
+    if 'password' not in session:
+        return jsonify({'error': 'ログインしてください。'}), 401
+
+    password = session['password']
+    entries = load_diary_index(password)
+    if entries is None:
+        return jsonify({'error': 'データの復号に失敗しました。'}), 403
+
+    limit = min(max(request.args.get('limit', PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    page, next_cursor = paginate(entries, request.args.get('year'), request.args.get('cursor'), limit)
+    diaries = read_diaries(page, password)
+    if diaries is None:
+        return jsonify({'error': 'データの復号に失敗しました。'}), 403
 
-    return render_template('index.html', diaries=diaries, years=years, display_title=display_title, selected_year=selected_year)
+    return jsonify({
+        'diaries': [
+            {
+                'id': diary['id'],
+                'title': diary['data'].get('title', ''),
+                'date': diary['data'].get('date', ''),
+                'content': diary['data'].get('content', ''),
+                'editUrl': url_for('edit', diary_id=diary['id']),
+            }
+            for diary in diaries
+        ],
+        'nextCursor': next_cursor,
+    })
+
+@app.route('/search')
+def search():
+    if 'password' not in session:
+        return redirect(url_for('login'))
+
+    password = session['password']
+    query = request.args.get('q', '').strip()
+    if not query:
+        return redirect(url_for('index'))
+    diaries = []
+
+    entries = load_diary_index(password)
+    if entries is None:
+        return redirect(url_for('login', error='データの復号に失敗しました。再度ログインしてください。'))
+    years = sorted({entry_year(entry) for entry in entries}, reverse=True)
+
+    terms = search_terms(query)
+    if terms:
+        # 検索用の索引で候補を絞り、候補の日記だけを新しい順に復号して確かめる
+        try:
+            candidate_ids = set(search_index.candidates(password, terms, build_search_items))
+        except Exception:
+            return redirect(url_for('login', error='データの復号に失敗しました。再度ログインしてください。'))
+        candidates = [entry for entry in entries if entry['id'] in candidate_ids]
+        for start in range(0, len(candidates), PAGE_SIZE):
+            found = read_diaries(candidates[start:start + PAGE_SIZE], password)
+            if found is None:
+                return redirect(url_for('login', error='データの復号に失敗しました。再度ログインしてください。'))
+            diaries.extend(diary for diary in found if matches(diary['data'], terms))
+            if len(diaries) >= SEARCH_LIMIT:
+                break
+        diaries = diaries[:SEARCH_LIMIT]
+
+    return render_template('index.html', diaries=diaries, years=years, display_title=f"「{query}」の検索結果",
+                           selected_year=None, next_cursor=None, search_query=query)
 
 @app.route('/new', methods=['POST'])
 def new_diary():
@@ -146,14 +246,10 @@ def new_diary():
     data = {'title': title, 'content': content, 'date': date}
     encrypted_data = encrypt_data(data, password)
 
-    year_dir = os.path.join(DATA_DIR, now.strftime('%Y'))
-    os.makedirs(year_dir, exist_ok=True)
-
-    filename = f"{now.strftime('%Y%m%d%H%M%S%f')}.json.encrypted"
-    filepath = os.path.join(year_dir, filename)
-    
-    with open(filepath, 'wb') as f:
-        f.write(encrypted_data)
+    diary_id = make_diary_id(now)
+    store.write(diary_id, encrypted_data)
+    diary_index.upsert(password, index_entry(diary_id, data), build_index_entries)
+    search_index.update(password, diary_id, None, diary_text(data), build_search_items)
 
     return redirect(url_for('index'))
 
@@ -164,43 +260,107 @@ def edit(diary_id):
     
     password = session['password']
     
-    # 安全なファイルパスを構築
-    filepath = os.path.abspath(os.path.join(DATA_DIR, diary_id))
-    if not filepath.startswith(os.path.abspath(DATA_DIR)):
+    # data/ の外を指すIDは受け付けない
+    try:
+        diary_id = normalize_id(diary_id)
+    except ValueError:
         return "不正なリクエストです", 400
 
-    if not os.path.exists(filepath):
+    if not store.exists(diary_id):
         return "日記が見つかりません", 404
 
     if request.method == 'POST':
-        with open(filepath, 'rb') as f:
-            encrypted_data = f.read()
-        
-        decrypted_data = decrypt_data(encrypted_data, password)
+        decrypted_data = read_diary(diary_id, password)
         if not decrypted_data:
             return redirect(url_for('login', error='データの復号に失敗しました。'))
 
         # データを更新
+        old_text = diary_text(decrypted_data)
         decrypted_data['title'] = request.form['title']
         decrypted_data['content'] = request.form['content']
         
         # 更新したデータを暗号化して上書き保存
         new_encrypted_data = encrypt_data(decrypted_data, password)
-        with open(filepath, 'wb') as f:
-            f.write(new_encrypted_data)
-            
+        store.write(diary_id, new_encrypted_data)
+        diary_index.upsert(password, index_entry(diary_id, decrypted_data), build_index_entries)
+        search_index.update(password, diary_id, old_text, diary_text(decrypted_data), build_search_items)
+
         return redirect(url_for('index'))
 
     # GETリクエストの場合
-    with open(filepath, 'rb') as f:
-        encrypted_data = f.read()
-    
-    decrypted_data = decrypt_data(encrypted_data, password)
+    decrypted_data = read_diary(diary_id, password)
     if not decrypted_data:
         return redirect(url_for('login', error='データの復号に失敗しました。'))
 
     return render_template('edit.html', diary=decrypted_data, diary_id=diary_id)
 
 
+# 旧形式（ファイルごとのソルト）の日記を、保管庫の鍵で暗号化し直すコマンド
+# 使い方: flask --app app migrate-vault
+@app.cli.command('migrate-vault')
+@click.option('--password', prompt=True, hide_input=True, help='日記のパスワード')
+def migrate_vault(password):
+    def migrate_diary(diary_id):
+        encrypted_data = store.read(diary_id)
+        if encrypted_data is None or not is_legacy(encrypted_data):
+            return 'skipped'
+        decrypted_data = decrypt_data(encrypted_data, password)
+        if decrypted_data is None:
+            return 'failed'
+        store.write(diary_id, encrypt_data(decrypted_data, password))
+        return 'migrated'
+
+    results = list(decrypt_pool.map(migrate_diary, store.list_ids()))
+    migrated = results.count('migrated')
+    failed = results.count('failed')
+    click.echo(f'{migrated}件の日記を新しい形式に変換しました。')
+    if failed:
+        click.echo(f'{failed}件の日記は復号できませんでした。パスワードを確認してください。', err=True)
+
+
+# 索引を作り直すコマンド（data/ に日記ファイルを直接コピーした場合などに使う）
+# 使い方: flask --app app rebuild-index
+@app.cli.command('rebuild-index')
+@click.option('--password', prompt=True, hide_input=True, help='日記のパスワード')
+def rebuild_index(password):
+    try:
+        diaries = read_all_diaries(password)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    diary_index.replace(password, [index_entry(diary_id, data) for diary_id, data in diaries])
+    search_index.replace(password, [(diary_id, diary_text(data)) for diary_id, data in diaries])
+    click.echo(f'{len(diaries)}件の日記の索引を作りました。')
+
+
+# パスワード確認用の値を作るコマンド（以前のバージョンで作った保管庫向け）
+# 使い方: flask --app app create-verifier
+@app.cli.command('create-verifier')
+@click.option('--password', prompt=True, hide_input=True, help='日記のパスワード')
+def create_verifier(password):
+    if not check_password_with_diary(password):
+        raise click.ClickException('パスワードが間違っています。')
+    vault.set_verifier(password)
+    click.echo('パスワード確認用の値を保存しました。')
+
+
+# 日記の保存形式を変換するコマンド（暗号化したままコピーするのでパスワードは不要）
+# 使い方: flask --app app convert-storage --to segments
+@app.cli.command('convert-storage')
+@click.option('--to', 'target', type=click.Choice(['segments', 'files']), required=True, help='変換先の保存形式')
+def convert_storage(target):
+    if target == 'segments':
+        source, destination = FileStore(DATA_DIR), SegmentStore(DATA_DIR)
+    else:
+        source, destination = SegmentStore(DATA_DIR), FileStore(DATA_DIR)
+    try:
+        count = copy_diaries(source, destination)
+    finally:
+        source.close()
+        destination.close()
+    click.echo(f'{count}件の日記を {target} 形式でコピーしました。')
+    click.echo(f'環境変数 DIARY_STORAGE={target} を設定してからアプリを起動してください。'
+               '元の形式のデータは、確認したあとで削除できます。')
+
+
 if __name__ == '__main__':
     app.run(debug=True, port=5001)
@@ -0,0 +1,141 @@
+"""日記アプリの主な画面を、保管庫の大きさを変えながら測るベンチマーク
+
+使い方:
+    python bench/bench_app.py --sizes 100 1000 10000 --storage files segments --output result.json
+
+make_vault.py で合成した保管庫を一時ディレクトリに作り、Flask のテストクライアントで
+ログイン・一覧（/）・年での絞り込み・編集画面の表示と保存にかかる時間を測ります。
+encrypt_data と decrypt_data だけの処理量（1秒あたりの件数）も測ります。
+結果は JSON で出力するので、保存形式や鍵の管理を変えたときの前後を比べられます。
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+from diary_index import INDEX_FILE  # noqa: E402
+from make_vault import PASSWORD, make_vault, use_vault  # noqa: E402
+from vault import clear_key_cache  # noqa: E402
+
+
+def summarize(samples):
+    return {
+        'median_ms': round(statistics.median(samples), 2),
+        'min_ms': round(min(samples), 2),
+        'max_ms': round(max(samples), 2),
+    }
+
+
+# fn() を repeat 回呼び、期待したステータスが返ったことを確かめながら時間を測る
+def timed_requests(fn, repeat, expected=200, before=None):
+    samples = []
+    for _ in range(repeat):
+        if before:
+            before()
+        start = time.perf_counter()
+        response = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+        if response.status_code != expected:
+            raise RuntimeError(f'ステータス {response.status_code}（期待値 {expected}）: {response.request.path}')
+    return summarize(samples)
+
+
+def login(client):
+    return client.post('/login', data={'password': PASSWORD})
+
+
+def measure_app(diaries, repeat):
+    client = app.app.test_client()
+    # ログインは毎回、鍵のキャッシュがない状態（起動直後と同じ）で測る
+    results = {'login': timed_requests(lambda: login(client), repeat, 302, before=clear_key_cache)}
+
+    years = sorted({diary_id.split(os.sep, 1)[0] for diary_id, _ in diaries})
+    year = years[len(years) // 2]
+    diary_id = diaries[len(diaries) // 2][0]
+    results['index'] = timed_requests(lambda: client.get('/'), repeat)
+    results['year'] = timed_requests(lambda: client.get(f'/?year={year}'), repeat)
+    results['edit_get'] = timed_requests(lambda: client.get(f'/edit/{diary_id}'), repeat)
+    counter = iter(range(repeat))
+    results['edit_post'] = timed_requests(
+        lambda: client.post(f'/edit/{diary_id}', data={'title': f'編集 {next(counter)}', 'content': '編集した本文'}),
+        repeat, 302,
+    )
+
+    # 一覧用の索引がない状態（初回の表示）では、全件を復号して索引を作る
+    index_path = os.path.join(app.DATA_DIR, INDEX_FILE)
+    results['index_rebuild'] = timed_requests(lambda: client.get('/'), 1, before=lambda: os.remove(index_path))
+    return results
+
+
+# encrypt_data と decrypt_data だけを count 回ずつ呼んだときの処理量
+def measure_crypto(diaries, count):
+    samples = [data for _, data in diaries[:count]]
+    samples = (samples * (count // max(len(samples), 1) + 1))[:count]
+    app.vault.key(PASSWORD)
+
+    start = time.perf_counter()
+    encrypted = [app.encrypt_data(data, PASSWORD) for data in samples]
+    encrypt_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for encrypted_data in encrypted:
+        if app.decrypt_data(encrypted_data, PASSWORD) is None:
+            raise RuntimeError('合成した日記を復号できませんでした')
+    decrypt_seconds = time.perf_counter() - start
+
+    total_bytes = sum(len(encrypted_data) for encrypted_data in encrypted)
+    return {
+        'operations': count,
+        'encrypt_per_sec': round(count / encrypt_seconds),
+        'decrypt_per_sec': round(count / decrypt_seconds),
+        'decrypt_mb_per_sec': round(total_bytes / decrypt_seconds / 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000], help='保管庫の件数')
+    parser.add_argument('--storage', nargs='+', choices=['files', 'segments'], default=['files'], help='保存形式')
+    parser.add_argument('--repeat', type=int, default=5, help='画面ごとに測る回数')
+    parser.add_argument('--crypto-ops', type=int, default=1000, help='encrypt_data/decrypt_data を呼ぶ回数')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help='復号に使うスレッド数')
+    parser.add_argument('--output', help='結果の JSON を保存するファイル（省略すると標準出力）')
+    args = parser.parse_args()
+
+    app.app.config['TESTING'] = True
+    report = {'cpus': os.cpu_count(), 'workers': args.workers, 'page_size': app.PAGE_SIZE,
+              'repeat': args.repeat, 'vaults': []}
+    for storage in args.storage:
+        for count in args.sizes:
+            with tempfile.TemporaryDirectory() as tmp:
+                start = time.perf_counter()
+                diaries = make_vault(tmp, count, workers=args.workers, storage=storage, verifier=True, indexes=True)
+                result = {'storage': storage, 'entries': count,
+                          'generate_s': round(time.perf_counter() - start, 2)}
+                use_vault(tmp, args.workers, storage)
+                try:
+                    result['requests'] = measure_app(diaries, args.repeat)
+                    result['crypto'] = measure_crypto(diaries, args.crypto_ops)
+                finally:
+                    app.store.close()
+                    app.decrypt_pool.shutdown()
+                report['vaults'].append(result)
+                print(json.dumps(result, ensure_ascii=False), file=sys.stderr)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""日記の復号を1スレッドと複数スレッドで比べるベンチマーク
+
+使い方:
+    python bench/bench_decrypt.py --sizes 100 1000 10000 --workers 8
+
+合成した保管庫（新形式）と、ファイルごとにソルトを持つ旧形式の保管庫を一時ディレクトリに作り、
+全件の復号（索引の作成・移行と同じ処理）と1ページ分の復号にかかる時間を測ります。
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+from make_vault import PASSWORD, make_vault, use_vault  # noqa: E402
+from vault import clear_key_cache  # noqa: E402
+
+
+def timed(fn, clear_keys):
+    if clear_keys:
+        # 旧形式はファイルごとの鍵導出が主なので、キャッシュなしの状態で測る
+        clear_key_cache()
+    start = time.perf_counter()
+    fn()
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+def measure(data_dir, workers, legacy):
+    results = {}
+    for label, count in (('sequential', 1), ('parallel', workers)):
+        use_vault(data_dir, count)
+        app.vault.key(PASSWORD)
+        entries = sorted(app.build_index_entries(PASSWORD), key=lambda e: e['date'], reverse=True)
+        results[label] = {
+            'all_ms': timed(lambda: app.build_index_entries(PASSWORD), legacy),
+            'page_ms': timed(lambda: app.read_diaries(entries[:app.PAGE_SIZE], PASSWORD), legacy),
+        }
+        app.decrypt_pool.shutdown()
+    results['speedup_all'] = round(results['sequential']['all_ms'] / max(results['parallel']['all_ms'], 0.1), 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000], help='新形式の保管庫の件数')
+    parser.add_argument('--legacy-sizes', type=int, nargs='*', default=[100], help='旧形式の保管庫の件数')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help='並列に復号するスレッド数')
+    args = parser.parse_args()
+
+    report = {'cpus': os.cpu_count(), 'workers': args.workers, 'vaults': []}
+    for legacy, sizes in ((False, args.sizes), (True, args.legacy_sizes)):
+        for count in sizes:
+            with tempfile.TemporaryDirectory() as tmp:
+                make_vault(tmp, count, legacy=legacy, workers=args.workers)
+                result = {'format': 'legacy' if legacy else 'v2', 'entries': count}
+                result.update(measure(tmp, args.workers, legacy))
+                report['vaults'].append(result)
+                print(json.dumps(result, ensure_ascii=False), file=sys.stderr)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
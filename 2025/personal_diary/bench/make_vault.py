@@ -0,0 +1,121 @@
+"""合成した日記の保管庫を作る
+
+使い方:
+    python bench/make_vault.py /tmp/diary-data --count 10000 --password benchmark-password
+
+アプリで使うときは、作ったディレクトリを data/ という名前で置きます（パスワードは --password の値）。
+
+日記は --start の年から --years 年分に均等に並べ、本文の長さは --seed で決まる乱数でばらつかせます。
+--legacy を付けると、ファイルごとにソルトを持つ旧形式で書き込みます。
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptography.fernet import Fernet  # noqa: E402
+
+from diary_index import DiaryIndex, index_entry  # noqa: E402
+from search_index import SearchIndex, diary_text  # noqa: E402
+from storage import STORAGE_TYPES, open_store  # noqa: E402
+from vault import SALT_SIZE, Vault, derive_key  # noqa: E402
+
+PASSWORD = 'benchmark-password'
+WRITE_BATCH = 500
+
+
+# i 件目の合成した日記（ID と 日記）
+def synthetic_diary(i, created, rng):
+    data = {
+        'title': f'日記 {i}',
+        'content': f'{created:%Y年%m月%d日}の出来事。' * rng.randint(5, 40),
+        'date': created.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    diary_id = os.path.join(created.strftime('%Y'), f'{created:%Y%m%d%H%M%S%f}{i:06d}.json.encrypted')
+    return diary_id, data
+
+
+# 合成した日記を count 件書き込み、(ID, 日記) の組を返す（legacy=True なら旧形式）
+def make_vault(data_dir, count, legacy=False, workers=8, password=PASSWORD, storage='files',
+               start_year=2015, years=10, seed=0, verifier=False, indexes=False):
+    os.makedirs(data_dir, exist_ok=True)
+    vault = Vault(data_dir)
+    rng = random.Random(seed)
+    start = datetime(start_year, 1, 1)
+    step = timedelta(days=365 * years) / max(count, 1)
+    diaries = [synthetic_diary(i, start + step * i, rng) for i in range(count)]
+
+    def encrypt(item):
+        diary_id, data = item
+        if legacy:
+            salt = os.urandom(SALT_SIZE)
+            # 旧形式はファイルごとに鍵を導出するので、キャッシュを通さない
+            encrypted_data = salt + Fernet(derive_key(password, salt)).encrypt(json.dumps(data).encode())
+        else:
+            encrypted_data = vault.encrypt(data, password)
+        return diary_id, encrypted_data
+
+    store = open_store(storage, data_dir)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for begin in range(0, count, WRITE_BATCH):
+                store.write_many(list(pool.map(encrypt, diaries[begin:begin + WRITE_BATCH])))
+    finally:
+        store.close()
+
+    if verifier:
+        vault.set_verifier(password)
+    if indexes:
+        DiaryIndex(data_dir, vault).replace(password, [index_entry(i, d) for i, d in diaries])
+        SearchIndex(data_dir, vault).replace(password, [(i, diary_text(d)) for i, d in diaries])
+    return diaries
+
+
+# app.py が使う保管庫を data_dir に切り替える
+def use_vault(data_dir, workers, storage='files'):
+    import app
+
+    if getattr(app, 'store', None) is not None:
+        app.store.close()
+    app.DATA_DIR = data_dir
+    app.vault = Vault(data_dir)
+    app.store = open_store(storage, data_dir)
+    app.diary_index = DiaryIndex(data_dir, app.vault)
+    app.search_index = SearchIndex(data_dir, app.vault)
+    app.decrypt_pool = ThreadPoolExecutor(max_workers=workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('data_dir', help='保管庫を作るディレクトリ')
+    parser.add_argument('--count', type=int, default=1000, help='日記の件数')
+    parser.add_argument('--password', default=PASSWORD, help='暗号化に使うパスワード')
+    parser.add_argument('--storage', choices=list(STORAGE_TYPES), default='files', help='保存形式')
+    parser.add_argument('--legacy', action='store_true', help='旧形式（ファイルごとのソルト）で書き込む')
+    parser.add_argument('--start', type=int, default=2015, help='最初の日記の年')
+    parser.add_argument('--years', type=int, default=10, help='日記を並べる年数')
+    parser.add_argument('--seed', type=int, default=0, help='本文の長さを決める乱数の種')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help='暗号化に使うスレッド数')
+    parser.add_argument('--no-verifier', action='store_true', help='パスワード確認用の値を作らない')
+    parser.add_argument('--no-index', action='store_true', help='一覧用・検索用の索引を作らない')
+    args = parser.parse_args()
+
+    if os.path.exists(args.data_dir) and os.listdir(args.data_dir):
+        parser.error(f'{args.data_dir} は空ではありません')
+    diaries = make_vault(
+        args.data_dir, args.count, legacy=args.legacy, workers=args.workers, password=args.password,
+        storage=args.storage, start_year=args.start, years=args.years, seed=args.seed,
+        verifier=not args.no_verifier, indexes=not args.no_index,
+    )
+    print(json.dumps({'data_dir': args.data_dir, 'entries': len(diaries), 'storage': args.storage,
+                      'format': 'legacy' if args.legacy else 'v2'}, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+# 日記の一覧表示用の索引（ID・日付・タイトル）
+#
+# 索引は保管庫の鍵で暗号化して data/index.enc に保存する。
+# 一覧ページや年の一覧は、索引を1回読んで復号するだけで作れる。
+import base64
+import json
+import os
+import threading
+
+from vault import write_file_atomic
+
+INDEX_FILE = 'index.enc'
+
+
+# 日記1件分の索引の項目
+def index_entry(diary_id, data):
+    return {'id': diary_id, 'date': data.get('date', ''), 'title': data.get('title', '')}
+
+
+# 日記のIDは「年/ファイル名」なので、先頭の部分が年になる
+def entry_year(entry):
+    return entry['id'].replace('\\', '/').split('/', 1)[0]
+
+
+# 日付の新しい順（同じ日時ならIDの新しい順）に並べるためのキー
+def _sort_key(entry):
+    return entry['date'], entry['id']
+
+
+class DiaryIndex:
+    def __init__(self, data_dir, vault):
+        self.path = os.path.join(data_dir, INDEX_FILE)
+        self.vault = vault
+        self._lock = threading.Lock()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    # 索引の項目を新しい順に返す（復号できない場合は例外を送出する）
+    def load(self, password):
+        with open(self.path, 'rb') as f:
+            encrypted_data = f.read()
+        return self.vault.decrypt(encrypted_data, password)['entries']
+
+    def _save(self, password, entries):
+        entries = sorted(entries, key=_sort_key, reverse=True)
+        document = {'version': 1, 'entries': entries}
+        write_file_atomic(self.path, self.vault.encrypt(document, password))
+        return entries
+
+    # 索引を読み込む。まだなければ build(password) が返す項目から作る
+    def load_or_build(self, password, build):
+        if self.exists():
+            return self.load(password)
+        with self._lock:
+            if self.exists():
+                return self.load(password)
+            entries = build(password)
+            if not entries:
+                return []
+            return self._save(password, entries)
+
+    # 索引全体を置き換える
+    def replace(self, password, entries):
+        with self._lock:
+            self._save(password, entries)
+
+    # 日記を書いたり編集したりしたときに、その1件分の項目を追加・更新する
+    def upsert(self, password, entry, build):
+        with self._lock:
+            entries = self.load(password) if self.exists() else build(password)
+            entries = [e for e in entries if e['id'] != entry['id']]
+            entries.append(entry)
+            self._save(password, entries)
+
+
+# ページ送りの位置（最後に表示した項目の日付とID）を文字列にする
+def encode_cursor(entry):
+    raw = json.dumps([entry['date'], entry['id']], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        date, diary_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return str(date), str(diary_id)
+    except (ValueError, TypeError, UnicodeError):
+        return None
+
+
+# 新しい順の項目から、指定した年・位置以降の limit 件と次のページの位置を返す
+def paginate(entries, year=None, cursor=None, limit=20):
+    if year:
+        entries = [entry for entry in entries if entry_year(entry) == year]
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        entries = [entry for entry in entries if _sort_key(entry) < position]
+    page = entries[:limit]
+    next_cursor = encode_cursor(page[-1]) if len(entries) > limit else None
+    return page, next_cursor
@@ -0,0 +1,150 @@
+# 日記の全文検索用の索引
+#
+# タイトルと本文を1文字・2文字単位（n-gram）に分け、n-gram → 日記の番号 の対応を
+# 保管庫の鍵で暗号化して data/search.enc に保存する。日本語も単語に分けずに検索できる。
+import os
+import threading
+import unicodedata
+
+from vault import write_file_atomic
+
+SEARCH_FILE = 'search.enc'
+
+
+# 全角・半角や大文字・小文字の違いをそろえる
+def normalize_text(text):
+    return unicodedata.normalize('NFKC', text).casefold()
+
+
+# 検索の対象にする日記の文字列
+def diary_text(data):
+    return f"{data.get('title', '')}\n{data.get('content', '')}"
+
+
+# 文字列に含まれる1文字と2文字のn-gram
+def text_grams(text):
+    text = normalize_text(text)
+    grams = set()
+    for i, ch in enumerate(text):
+        if ch.isspace():
+            continue
+        grams.add(ch)
+        following = text[i + 1:i + 2]
+        if following and not following.isspace():
+            grams.add(ch + following)
+    return grams
+
+
+# 検索語を空白で区切る（すべての語を含む日記を探す）
+def search_terms(query):
+    return normalize_text(query).split()
+
+
+# 検索語を探すのに使うn-gram（1文字ならその文字、2文字以上なら2文字ずつ）
+def term_grams(term):
+    if len(term) == 1:
+        return {term}
+    return {term[i:i + 2] for i in range(len(term) - 1)}
+
+
+# 日記が検索語をすべて含むかどうか（n-gramでの絞り込みのあとの確認に使う）
+def matches(data, terms):
+    text = normalize_text(diary_text(data))
+    return all(term in text for term in terms)
+
+
+class SearchIndex:
+    def __init__(self, data_dir, vault):
+        self.path = os.path.join(data_dir, SEARCH_FILE)
+        self.vault = vault
+        self._lock = threading.Lock()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _load(self, password):
+        with open(self.path, 'rb') as f:
+            encrypted_data = f.read()
+        document = self.vault.decrypt(encrypted_data, password)
+        return document['docs'], document['postings']
+
+    def _save(self, password, docs, postings):
+        document = {'version': 1, 'docs': docs, 'postings': postings}
+        write_file_atomic(self.path, self.vault.encrypt(document, password))
+
+    # build(password) が返す (ID, 文字列) の組から索引を作る
+    @staticmethod
+    def _build(items):
+        docs = []
+        postings = {}
+        for diary_id, text in items:
+            docno = len(docs)
+            docs.append(diary_id)
+            for gram in text_grams(text):
+                postings.setdefault(gram, []).append(docno)
+        return docs, postings
+
+    def _load_or_build(self, password, build):
+        if self.exists():
+            return self._load(password)
+        docs, postings = self._build(build(password))
+        if docs:
+            self._save(password, docs, postings)
+        return docs, postings
+
+    # 検索語のn-gramをすべて含む日記のIDを返す（実際に語句を含むかは呼び出し側で確かめる）
+    def candidates(self, password, terms, build):
+        if self.exists():
+            docs, postings = self._load(password)
+        else:
+            with self._lock:
+                docs, postings = self._load_or_build(password, build)
+        grams = set()
+        for term in terms:
+            grams |= term_grams(term)
+        if not grams:
+            return []
+        # 件数の少ないn-gramから順に絞り込む
+        lists = sorted((postings.get(gram, []) for gram in grams), key=len)
+        found = set(lists[0])
+        for docnos in lists[1:]:
+            if not found:
+                break
+            found.intersection_update(docnos)
+        return [docs[docno] for docno in sorted(found) if docs[docno] is not None]
+
+    # 日記を書いたり編集したりしたときに、その1件分だけ索引を更新する
+    def update(self, password, diary_id, old_text, new_text, build):
+        with self._lock:
+            if not self.exists():
+                # 索引がなければ、書き込んだ日記も含めて作る
+                docs, postings = self._build(build(password))
+                self._save(password, docs, postings)
+                return
+            docs, postings = self._load(password)
+            old_grams = text_grams(old_text) if old_text is not None else set()
+            new_grams = text_grams(new_text)
+            if diary_id in docs:
+                docno = docs.index(diary_id)
+            else:
+                docno = len(docs)
+                docs.append(diary_id)
+                old_grams = set()
+            for gram in old_grams - new_grams:
+                docnos = postings.get(gram, [])
+                if docno in docnos:
+                    docnos.remove(docno)
+                if not docnos:
+                    postings.pop(gram, None)
+            for gram in new_grams - old_grams:
+                docnos = postings.setdefault(gram, [])
+                if docno not in docnos:
+                    docnos.append(docno)
+                    docnos.sort()
+            self._save(password, docs, postings)
+
+    # 索引全体を作り直す
+    def replace(self, password, items):
+        with self._lock:
+            docs, postings = self._build(items)
+            self._save(password, docs, postings)
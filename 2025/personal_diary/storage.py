@@ -0,0 +1,367 @@
+# 暗号化した日記の保存先
+#
+# FileStore    日記1件を data/年/日時.json.encrypted の1ファイルに保存する（これまでの形式）
+# SegmentStore 年ごとのセグメントファイル data/segments/年.seg に日記を追記していく形式
+#
+# どちらも日記のIDは「年/日時.json.encrypted」で共通なので、索引はそのまま使える。
+import json
+import mmap
+import os
+import struct
+import threading
+
+from vault import write_file_atomic
+
+DIARY_SUFFIX = '.json.encrypted'
+
+
+# 新しい日記のID
+def make_diary_id(now):
+    return os.path.join(now.strftime('%Y'), f"{now.strftime('%Y%m%d%H%M%S%f')}{DIARY_SUFFIX}")
+
+
+# IDの表記をそろえる（data/ の外を指すIDは ValueError）
+def normalize_id(diary_id):
+    normalized = os.path.normpath(diary_id)
+    if os.path.isabs(normalized) or normalized in ('.', '..') or normalized.startswith('..' + os.sep):
+        raise ValueError(f'不正な日記のIDです: {diary_id}')
+    return normalized
+
+
+def _id_year(diary_id):
+    return diary_id.replace('\\', '/').split('/', 1)[0]
+
+
+class FileStore:
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+
+    def _path(self, diary_id):
+        return os.path.join(self.data_dir, normalize_id(diary_id))
+
+    def list_ids(self):
+        ids = []
+        for root, _, files in os.walk(self.data_dir):
+            for file in files:
+                if file.endswith('.encrypted'):
+                    ids.append(os.path.relpath(os.path.join(root, file), self.data_dir))
+        return ids
+
+    def exists(self, diary_id):
+        return os.path.exists(self._path(diary_id))
+
+    # 暗号化したデータを返す（日記がなければ None）
+    def read(self, diary_id):
+        try:
+            with open(self._path(diary_id), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, diary_id, data):
+        path = self._path(diary_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_file_atomic(path, data)
+
+    def write_many(self, items):
+        for diary_id, data in items:
+            self.write(diary_id, data)
+
+    def close(self):
+        pass
+
+
+# セグメントの先頭: 目印(4バイト)・世代(8バイト)。詰め直すたびに世代を1つ増やす
+SEGMENT_HEADER = struct.Struct('>4sQ')
+SEGMENT_MAGIC = b'DSG1'
+# セグメントのレコード: 目印(4バイト)・IDの長さ(2バイト)・データの長さ(4バイト)・ID・データ
+RECORD_HEADER = struct.Struct('>4sHI')
+RECORD_MAGIC = b'DSR1'
+
+
+class SegmentStore:
+    """年ごとのセグメントファイルに日記を追記して保存する。
+
+    読み込みはセグメントをメモリマップして、オフセットの索引（segments/index.json）から
+    該当部分を切り出す。編集すると新しいレコードを追記し、古いレコードは不要になる。
+    不要なレコードが増えたセグメントは、バックグラウンドのスレッドで詰め直す。
+
+    索引にはセグメントの世代も保存しておき、セグメントの世代と食い違う場合（詰め直した直後に
+    止まった場合など）は索引を信用せず、セグメントを読み直す。
+    """
+
+    def __init__(self, data_dir, compact_min_garbage=1 << 20, compact_ratio=0.5, index_save_interval=64):
+        self.dir = os.path.join(data_dir, 'segments')
+        self.index_path = os.path.join(self.dir, 'index.json')
+        self.compact_min_garbage = compact_min_garbage
+        self.compact_ratio = compact_ratio
+        self.index_save_interval = index_save_interval
+        self._lock = threading.RLock()
+        self._offsets = {}  # ID -> (年, データの位置, データの長さ)
+        self._sizes = {}  # 年 -> セグメントの大きさ
+        self._generations = {}  # 年 -> セグメントの世代
+        self._garbage = {}  # 年 -> 不要になったレコードの合計バイト数
+        self._maps = {}
+        self._appenders = {}
+        self._compacting = set()
+        self._unsaved = 0
+        os.makedirs(self.dir, exist_ok=True)
+        self._load()
+
+    def _segment_path(self, year):
+        return os.path.join(self.dir, f'{year}.seg')
+
+    @staticmethod
+    def _record_size(diary_id, length):
+        return RECORD_HEADER.size + len(diary_id.encode('utf-8')) + length
+
+    # セグメントの世代を読む（作成途中で止まったセグメントは、空のセグメントとして作り直す）
+    def _read_generation(self, year):
+        path = self._segment_path(year)
+        with open(path, 'rb') as f:
+            header = f.read(SEGMENT_HEADER.size)
+        if len(header) < SEGMENT_HEADER.size:
+            write_file_atomic(path, SEGMENT_HEADER.pack(SEGMENT_MAGIC, 0))
+            return 0
+        magic, generation = SEGMENT_HEADER.unpack(header)
+        if magic != SEGMENT_MAGIC:
+            raise ValueError(f'セグメントの形式が正しくありません: {path}')
+        return generation
+
+    def _load(self):
+        segments = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding='utf-8') as f:
+                document = json.load(f)
+            segments = document['segments']
+            self._offsets = {diary_id: tuple(location) for diary_id, location in document['records'].items()}
+
+        for name in os.listdir(self.dir):
+            if name.endswith('.compact'):
+                # 詰め直しの途中で止まったときの書きかけのファイル
+                os.remove(os.path.join(self.dir, name))
+        years = {name[:-len('.seg')] for name in os.listdir(self.dir) if name.endswith('.seg')}
+        # セグメントが消えている年のレコードは読めないので捨てる
+        self._offsets = {k: v for k, v in self._offsets.items() if v[0] in years}
+        for year in sorted(years):
+            generation = self._read_generation(year)
+            actual = os.path.getsize(self._segment_path(year))
+            indexed_generation, start = segments.get(year, (None, 0))
+            if indexed_generation != generation or actual < start:
+                # 索引を保存したあとで詰め直した場合など、索引の位置が使えないときはセグメントを読み直す
+                self._offsets = {k: v for k, v in self._offsets.items() if v[0] != year}
+                start = 0
+            self._generations[year] = generation
+            # index.json を保存したあとに追記されたレコードを読み込む
+            self._scan(year, max(start, SEGMENT_HEADER.size))
+
+        for year, size in self._sizes.items():
+            live = sum(self._record_size(diary_id, location[2])
+                       for diary_id, location in self._offsets.items() if location[0] == year)
+            self._garbage[year] = size - SEGMENT_HEADER.size - live
+
+    def _scan(self, year, start):
+        path = self._segment_path(year)
+        with open(path, 'rb') as f:
+            f.seek(start)
+            position = start
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                magic, id_length, length = RECORD_HEADER.unpack(header)
+                body = f.read(id_length + length)
+                if magic != RECORD_MAGIC or len(body) < id_length + length:
+                    break
+                diary_id = body[:id_length].decode('utf-8')
+                self._offsets[diary_id] = (year, position + RECORD_HEADER.size + id_length, length)
+                position += RECORD_HEADER.size + id_length + length
+        if position < os.path.getsize(path):
+            # 書き込み途中で止まったレコードを切り捨てる
+            os.truncate(path, position)
+        self._sizes[year] = position
+
+    def _save_index(self):
+        document = {
+            'segments': {year: [self._generations[year], size] for year, size in self._sizes.items()},
+            'records': {diary_id: list(location) for diary_id, location in self._offsets.items()},
+        }
+        write_file_atomic(self.index_path, json.dumps(document, ensure_ascii=False).encode('utf-8'))
+        self._unsaved = 0
+
+    def _map(self, year, needed):
+        mm = self._maps.get(year)
+        if mm is None or len(mm) < needed:
+            if mm is not None:
+                mm.close()
+            with open(self._segment_path(year), 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[year] = mm
+        return mm
+
+    def _close_segment(self, year):
+        appender = self._appenders.pop(year, None)
+        if appender is not None:
+            appender.close()
+        mm = self._maps.pop(year, None)
+        if mm is not None:
+            mm.close()
+
+    def _appender(self, year):
+        appender = self._appenders.get(year)
+        if appender is None:
+            appender = self._appenders[year] = open(self._segment_path(year), 'ab')
+            if year not in self._sizes:
+                appender.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, 0))
+                self._sizes[year] = SEGMENT_HEADER.size
+                self._generations[year] = 0
+                self._garbage[year] = 0
+        return appender
+
+    def list_ids(self):
+        with self._lock:
+            return list(self._offsets)
+
+    def exists(self, diary_id):
+        with self._lock:
+            return normalize_id(diary_id) in self._offsets
+
+    def read(self, diary_id):
+        diary_id = normalize_id(diary_id)
+        with self._lock:
+            location = self._offsets.get(diary_id)
+            if location is None:
+                return None
+            year, offset, length = location
+            return self._map(year, offset + length)[offset:offset + length]
+
+    def write(self, diary_id, data):
+        self.write_many([(diary_id, data)])
+
+    # まとめて追記し、fsync と索引の保存はセグメントごとに1回で済ませる
+    def write_many(self, items):
+        with self._lock:
+            touched = set()
+            for diary_id, data in items:
+                diary_id = normalize_id(diary_id)
+                year = _id_year(diary_id)
+                appender = self._appender(year)
+                key = diary_id.encode('utf-8')
+                position = self._sizes[year]
+                appender.write(RECORD_HEADER.pack(RECORD_MAGIC, len(key), len(data)) + key + data)
+                previous = self._offsets.get(diary_id)
+                if previous is not None:
+                    self._garbage[previous[0]] = self._garbage.get(previous[0], 0) + self._record_size(diary_id, previous[2])
+                self._offsets[diary_id] = (year, position + RECORD_HEADER.size + len(key), len(data))
+                self._sizes[year] = position + RECORD_HEADER.size + len(key) + len(data)
+                touched.add(year)
+                self._unsaved += 1
+            for year in touched:
+                appender = self._appenders[year]
+                appender.flush()
+                os.fsync(appender.fileno())
+            # 索引はセグメントから作り直せるので、毎回ではなく何件かごとに保存する
+            if self._unsaved >= self.index_save_interval or len(items) > 1:
+                self._save_index()
+            for year in touched:
+                self._maybe_compact(year)
+
+    def _maybe_compact(self, year):
+        garbage = self._garbage.get(year, 0)
+        if year in self._compacting or garbage < self.compact_min_garbage:
+            return
+        if garbage < self._sizes.get(year, 0) * self.compact_ratio:
+            return
+        self._compacting.add(year)
+        threading.Thread(target=self.compact, args=(year,), name=f'compact-{year}', daemon=True).start()
+
+    # 不要になったレコードを除いてセグメントを書き直す
+    # 書き直しの間も読み書きできるように、ロックを取るのは最初と、最後に入れ替えるときだけにする
+    def compact(self, year):
+        try:
+            with self._lock:
+                if year not in self._sizes:
+                    return
+                end = self._sizes[year]
+                generation = self._generations[year] + 1
+                live = sorted(
+                    (location[1], diary_id, location[2])
+                    for diary_id, location in self._offsets.items()
+                    if location[0] == year
+                )
+            path = self._segment_path(year)
+            tmp_path = path + '.compact'
+            moved = {}
+            try:
+                # セグメントは追記しかしないので、end までの内容はロックの外で読んでも変わらない
+                with open(path, 'rb') as src, open(tmp_path, 'wb') as out:
+                    mm = mmap.mmap(src.fileno(), end, access=mmap.ACCESS_READ)
+                    try:
+                        out.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, generation))
+                        position = SEGMENT_HEADER.size
+                        for offset, diary_id, length in live:
+                            key = diary_id.encode('utf-8')
+                            out.write(RECORD_HEADER.pack(RECORD_MAGIC, len(key), length) + key + mm[offset:offset + length])
+                            moved[diary_id] = ((year, offset, length), (year, position + RECORD_HEADER.size + len(key), length))
+                            position += RECORD_HEADER.size + len(key) + length
+                    finally:
+                        mm.close()
+
+                    with self._lock:
+                        # 書き直している間に追記されたレコードは、そのまま後ろに付け足す
+                        tail_start = position
+                        src.seek(end)
+                        out.write(src.read(self._sizes[year] - end))
+                        out.flush()
+                        os.fsync(out.fileno())
+                        self._close_segment(year)
+                        os.replace(tmp_path, path)
+                        for diary_id, location in list(self._offsets.items()):
+                            if location[0] != year:
+                                continue
+                            if location[1] >= end:
+                                self._offsets[diary_id] = (year, location[1] - end + tail_start, location[2])
+                            elif diary_id in moved and moved[diary_id][0] == location:
+                                self._offsets[diary_id] = moved[diary_id][1]
+                        self._sizes[year] = tail_start + self._sizes[year] - end
+                        self._generations[year] = generation
+                        live_size = sum(self._record_size(diary_id, location[2])
+                                        for diary_id, location in self._offsets.items() if location[0] == year)
+                        self._garbage[year] = self._sizes[year] - SEGMENT_HEADER.size - live_size
+                        self._save_index()
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        finally:
+            with self._lock:
+                self._compacting.discard(year)
+
+    def close(self):
+        with self._lock:
+            if self._unsaved:
+                self._save_index()
+            for year in list(self._appenders) + list(self._maps):
+                self._close_segment(year)
+
+
+# 保存先から別の保存先へ、暗号化したまま日記をコピーする（件数を返す）
+def copy_diaries(source, target, batch_size=500):
+    ids = source.list_ids()
+    for start in range(0, len(ids), batch_size):
+        items = []
+        for diary_id in ids[start:start + batch_size]:
+            data = source.read(diary_id)
+            if data is not None:
+                items.append((diary_id, data))
+        target.write_many(items)
+    return len(ids)
+
+
+STORAGE_TYPES = {'files': FileStore, 'segments': SegmentStore}
+
+
+def open_store(kind, data_dir):
+    if kind not in STORAGE_TYPES:
+        raise ValueError(f'保存形式は {", ".join(STORAGE_TYPES)} のどれかを指定してください: {kind}')
+    return STORAGE_TYPES[kind](data_dir)
@@ -0,0 +1,168 @@
+# 日記データの暗号化と鍵の管理
+#
+# 新しい形式では data/vault.json に保存したソルトから、パスワードごとに一度だけ鍵を導出し、
+# すべての日記をその鍵で暗号化する。ファイルごとにソルトを持つ旧形式のファイルもそのまま読める。
+import base64
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+KDF_ITERATIONS = 100000
+SALT_SIZE = 16
+# 新形式のファイルの先頭に付ける目印。旧形式は先頭16バイトがファイルごとのソルト
+MAGIC = b'PDV2'
+# Fernetトークンの先頭（バージョン0x80と時刻の上位バイト）をBase64にしたもの
+FERNET_PREFIX = b'gAAAA'
+# パスワード確認用の値を作るときのラベル（日記の暗号化とは別の用途であることを示す）
+VERIFIER_LABEL = b'personal_diary password verifier'
+# 鍵のキャッシュに残す件数（ログイン中の保管庫の鍵と、旧形式の日記1ページ分の鍵が入る大きさ）
+KEY_CACHE_SIZE = 64
+
+_key_cache = OrderedDict()
+_key_cache_lock = threading.Lock()
+# キャッシュはパスワードそのものではなく、プロセスごとの乱数で計算したHMACで引く
+_key_cache_secret = os.urandom(32)
+
+
+# パスワードとソルトから鍵を生成する関数（キャッシュしない）
+def derive_key(password, salt, iterations=KDF_ITERATIONS):
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=salt,
+        iterations=iterations,
+    )
+    return base64.urlsafe_b64encode(kdf.derive(password.encode()))
+
+
+def _password_tag(password):
+    return hmac.new(_key_cache_secret, password.encode(), hashlib.sha256).digest()
+
+
+# PBKDF2は重いので、同じパスワードとソルトの組み合わせは、最近使った KEY_CACHE_SIZE 件まで結果を使い回す
+def get_key(password, salt, iterations=KDF_ITERATIONS):
+    cache_key = (_password_tag(password), salt, iterations)
+    with _key_cache_lock:
+        key = _key_cache.get(cache_key)
+        if key is not None:
+            _key_cache.move_to_end(cache_key)
+            return key
+    # 並列に復号するスレッドが同時に導出できるように、導出はロックの外で行う
+    key = derive_key(password, salt, iterations)
+    with _key_cache_lock:
+        _key_cache[cache_key] = key
+        _key_cache.move_to_end(cache_key)
+        while len(_key_cache) > KEY_CACHE_SIZE:
+            _key_cache.popitem(last=False)
+    return key
+
+
+# ログアウトしたときに、そのパスワードから導出した鍵をキャッシュから消す
+def forget_keys(password):
+    tag = _password_tag(password)
+    with _key_cache_lock:
+        for cache_key in [k for k in _key_cache if k[0] == tag]:
+            del _key_cache[cache_key]
+
+
+def clear_key_cache():
+    with _key_cache_lock:
+        _key_cache.clear()
+
+
+# 一時ファイルに書いてから置き換えることで、書き込み途中のファイルが残らないようにする
+def write_file_atomic(path, data):
+    dirname = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# 旧形式（ファイルごとのソルト）で暗号化されたデータかどうか
+def is_legacy(encrypted_data):
+    header = len(MAGIC)
+    return not (encrypted_data[:header] == MAGIC
+                and encrypted_data[header:header + len(FERNET_PREFIX)] == FERNET_PREFIX)
+
+
+class Vault:
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.path = os.path.join(data_dir, 'vault.json')
+        self._lock = threading.Lock()
+        self._meta = None
+
+    # vault.json を読み込む（まだなければソルトを作って保存する）
+    def _load_meta(self):
+        if self._meta is not None:
+            return self._meta
+        with self._lock:
+            if self._meta is None:
+                if os.path.exists(self.path):
+                    with open(self.path, encoding='utf-8') as f:
+                        self._meta = json.load(f)
+                else:
+                    meta = {
+                        'version': 2,
+                        'salt': base64.b64encode(os.urandom(SALT_SIZE)).decode('ascii'),
+                        'iterations': KDF_ITERATIONS,
+                    }
+                    self._save_meta(meta)
+        return self._meta
+
+    def _save_meta(self, meta):
+        os.makedirs(self.data_dir, exist_ok=True)
+        write_file_atomic(self.path, json.dumps(meta, indent=2).encode('utf-8'))
+        self._meta = meta
+
+    # ログイン中のパスワードに対応する保管庫の鍵（一度導出したらキャッシュされる）
+    def key(self, password):
+        meta = self._load_meta()
+        return get_key(password, base64.b64decode(meta['salt']), meta['iterations'])
+
+    def encrypt(self, data, password):
+        f = Fernet(self.key(password))
+        return MAGIC + f.encrypt(json.dumps(data).encode())
+
+    # 復号できない場合は例外（cryptography.fernet.InvalidToken など）を送出する
+    def decrypt(self, encrypted_data, password):
+        if is_legacy(encrypted_data):
+            salt = encrypted_data[:SALT_SIZE]
+            f = Fernet(get_key(password, salt))
+            return json.loads(f.decrypt(encrypted_data[SALT_SIZE:]).decode())
+        f = Fernet(self.key(password))
+        return json.loads(f.decrypt(encrypted_data[len(MAGIC):]).decode())
+
+    def _verifier(self, password):
+        key = base64.urlsafe_b64decode(self.key(password))
+        return hmac.new(key, VERIFIER_LABEL, hashlib.sha256).digest()
+
+    def has_verifier(self):
+        return 'verifier' in self._load_meta()
+
+    # パスワードが正しいかを、鍵の導出1回と比較1回だけで確かめる
+    def verify_password(self, password):
+        expected = base64.b64decode(self._load_meta()['verifier'])
+        return hmac.compare_digest(self._verifier(password), expected)
+
+    # パスワード確認用の値を vault.json に保存する
+    def set_verifier(self, password):
+        verifier = base64.b64encode(self._verifier(password)).decode('ascii')
+        with self._lock:
+            self._save_meta(dict(self._meta, verifier=verifier))
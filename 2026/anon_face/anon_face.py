@@ -10,11 +10,8 @@ import sys
 import random
 from pathlib import Path
 
-import cv2
-import numpy as np
-from PIL import Image
-from openai import OpenAI
-from dotenv import load_dotenv
+# cv2・numpy・PIL・openai・dotenv は読み込みに時間がかかるため、
+# 使う関数の中で import する（--help やファイルがない場合はすぐに終わる）
 
 
 def detect_faces(image_path, debug_output_path=None):
@@ -28,6 +25,9 @@ def detect_faces(image_path, debug_output_path=None):
     Returns:
         検出された顔の座標リスト [(x, y, w, h), ...]
     """
+    import cv2
+    import numpy as np
+
     # 画像を読み込む
     img = cv2.imread(image_path)
     if img is None:
@@ -116,6 +116,8 @@ def merge_overlapping_faces(faces):
     Returns:
         統合された顔の座標リスト
     """
+    import numpy as np
+
     if len(faces) == 0:
         return np.array([])
     
@@ -170,6 +172,10 @@ def create_mask_image(image_shape, faces):
     Returns:
         マスク画像 (PIL Image, RGBA)
     """
+    import cv2
+    import numpy as np
+    from PIL import Image
+
     height, width = image_shape[:2]
     
     # 完全に不透明な白い画像を作成（背景は保持される）
@@ -271,6 +277,10 @@ def anonymize_with_dalle(image_path, mask_image, output_path, mask_path):
         output_path: 出力画像のパス
         mask_path: マスク画像の保存パス
     """
+    from dotenv import load_dotenv
+    from openai import OpenAI
+    from PIL import Image
+
     # OpenAI APIキーを取得
     load_dotenv()
     api_key = os.getenv('OPENAI_API_KEY')
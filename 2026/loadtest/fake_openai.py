@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""OpenAI APIの代わりに応答するローカルサーバー（負荷試験用）
+
+Responses API・Chat Completions API・音声合成APIの形だけを真似て、
+指定した待ち時間のあとに固定の応答を返します。
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MINDMAP_JSON = json.dumps(
+    {
+        "root": "負荷試験",
+        "children": [
+            {"topic": f"枝{i}", "children": [f"枝{i}-{j}" for j in range(1, 5)]}
+            for i in range(1, 7)
+        ],
+    },
+    ensure_ascii=False,
+)
+IDEAS_JSON = json.dumps([f"アイデア{i}" for i in range(1, 6)], ensure_ascii=False)
+
+# 無音のMP3フレーム（MPEG-1 Layer III, 128kbps, 44.1kHz, 約26ms）
+MP3_FRAME = bytes([0xFF, 0xFB, 0x90, 0xC4]) + bytes(413)
+
+
+class FakeSettings:
+    def __init__(self, latency: float, jitter: float, chunk_delay: float, chunk_size: int, audio_seconds: float):
+        self.latency = latency
+        self.jitter = jitter
+        self.chunk_delay = chunk_delay
+        self.chunk_size = chunk_size
+        self.audio_seconds = audio_seconds
+
+    def wait(self) -> None:
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _reply_text(prompt: str) -> str:
+    return IDEAS_JSON if "JSON array" in prompt else MINDMAP_JSON
+
+
+def _response_object(text: str, model: str) -> dict:
+    return {
+        "id": f"resp_{uuid.uuid4().hex}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": model,
+        "status": "completed",
+        "output": [
+            {
+                "type": "message",
+                "id": f"msg_{uuid.uuid4().hex}",
+                "role": "assistant",
+                "status": "completed",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }
+        ],
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+    }
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    settings: FakeSettings
+
+    def log_message(self, format: str, *args) -> None:  # noqa: A002
+        pass
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload: dict, status: int = 200) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_chunked(self, content_type: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _end_chunked(self) -> None:
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _pieces(self, text: str) -> list[str]:
+        size = self.settings.chunk_size
+        return [text[i : i + size] for i in range(0, len(text), size)]
+
+    def do_POST(self) -> None:  # noqa: N802
+        payload = self._read_json()
+        self.settings.wait()
+        if self.path.endswith("/responses"):
+            self._responses(payload)
+        elif self.path.endswith("/chat/completions"):
+            self._chat(payload)
+        elif self.path.endswith("/audio/speech"):
+            self._speech()
+        else:
+            self._send_json({"error": {"message": f"Unknown path {self.path}"}}, status=404)
+
+    def _responses(self, payload: dict) -> None:
+        model = payload.get("model", "fake-model")
+        text = _reply_text(str(payload.get("input", "")))
+        if not payload.get("stream"):
+            self._send_json(_response_object(text, model))
+            return
+
+        self._start_chunked("text/event-stream")
+        item_id = f"msg_{uuid.uuid4().hex}"
+        seq = 0
+        for piece in self._pieces(text):
+            event = {
+                "type": "response.output_text.delta",
+                "item_id": item_id,
+                "output_index": 0,
+                "content_index": 0,
+                "delta": piece,
+                "logprobs": [],
+                "sequence_number": seq,
+            }
+            seq += 1
+            self._chunk(f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n".encode())
+            time.sleep(self.settings.chunk_delay)
+        done = {"type": "response.completed", "sequence_number": seq, "response": _response_object(text, model)}
+        self._chunk(f"event: response.completed\ndata: {json.dumps(done, ensure_ascii=False)}\n\n".encode())
+        self._end_chunked()
+
+    def _chat(self, payload: dict) -> None:
+        model = payload.get("model", "fake-model")
+        messages = payload.get("messages") or [{}]
+        text = _reply_text(str(messages[-1].get("content", "")))
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex}", "created": int(time.time()), "model": model}
+        if not payload.get("stream"):
+            self._send_json(
+                {
+                    **base,
+                    "object": "chat.completion",
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": text},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                }
+            )
+            return
+
+        self._start_chunked("text/event-stream")
+        for piece in self._pieces(text):
+            chunk = {
+                **base,
+                "object": "chat.completion.chunk",
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            }
+            self._chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode())
+            time.sleep(self.settings.chunk_delay)
+        self._chunk(b"data: [DONE]\n\n")
+        self._end_chunked()
+
+    def _speech(self) -> None:
+        frames = max(1, int(self.settings.audio_seconds / 0.026))
+        self._start_chunked("audio/mpeg")
+        per_chunk = 40
+        for start in range(0, frames, per_chunk):
+            self._chunk(MP3_FRAME * min(per_chunk, frames - start))
+            time.sleep(self.settings.chunk_delay)
+        self._end_chunked()
+
+
+def start_server(settings: FakeSettings, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Starts the fake server in a background thread and returns it."""
+    handler = type("ConfiguredHandler", (Handler,), {"settings": settings})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-openai", daemon=True).start()
+    return server
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency", type=float, default=1.0, help="応答を返し始めるまでの秒数")
+    parser.add_argument("--jitter", type=float, default=0.2, help="待ち時間に加えるランダムな揺らぎ（秒）")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="ストリーミング時のチャンク間隔（秒）")
+    parser.add_argument("--chunk-size", type=int, default=12, help="ストリーミング時の1チャンクの文字数")
+    parser.add_argument("--audio-seconds", type=float, default=3.0, help="音声合成で返す音声の長さ（秒）")
+
+
+def settings_from_args(args: argparse.Namespace) -> FakeSettings:
+    return FakeSettings(args.latency, args.jitter, args.chunk_delay, args.chunk_size, args.audio_seconds)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OpenAI APIの代わりに応答するローカルサーバー")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+    server = start_server(settings_from_args(args), port=args.port)
+    print(f"OPENAI_BASE_URL=http://127.0.0.1:{server.server_address[1]}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
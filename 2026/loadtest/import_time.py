@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""アプリとCLIツールの起動時間（import にかかる時間）を測るツール
+
+新しいPythonプロセスで ``python -X importtime`` を使って対象のモジュールを import し、
+import 全体の時間・プロセスの起動から終了までの時間・時間のかかったモジュールを表示します。
+
+    python import_time.py
+    python import_time.py anon_face text-to-mp4 --repeat 10 --json
+    python import_time.py --check   # 起動時に重いライブラリを読み込んでいたら終了コード1
+
+CLIツールは ``--help`` を実行した場合の時間も測ります。
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# name: (ディレクトリ, import するモジュール, --help で起動するスクリプト, 起動時には読み込まないライブラリ)
+TARGETS = {
+    "anon_face": (ROOT / "anon_face", "anon_face", "anon_face.py", ["cv2", "numpy", "PIL", "openai", "dotenv"]),
+    "text-to-mp4": (ROOT / "text-to-mp4", "app", None, ["moviepy", "openai"]),
+    "text-to-mp4-asgi": (ROOT / "text-to-mp4", "asgi", None, ["moviepy", "openai"]),
+    "mindmap": (ROOT / "mindmap_edit", "app", None, ["openai"]),
+    "mindmap-asgi": (ROOT / "mindmap_edit", "asgi", None, ["openai"]),
+}
+
+PROBE = (
+    "import json, sys; sys.path.insert(0, '.'); import {module}; "
+    "print(json.dumps(sorted(name for name in {lazy!r} if name in sys.modules)))"
+)
+
+
+def parse_importtime(stderr: str) -> dict[str, tuple[int, int]]:
+    """``-X importtime`` の出力を {モジュール名: (self_us, cumulative_us)} にする。"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            modules[name.strip()] = (int(self_us), int(cumulative_us))
+        except ValueError:
+            continue  # 見出しの行
+    return modules
+
+
+def run(args: list[str], cwd: Path) -> tuple[subprocess.CompletedProcess, float]:
+    env = dict(os.environ)
+    # APIキーが設定されている場合（クライアントを使う設定）の起動経路を測る
+    env.setdefault("OPENAI_API_KEY", "sk-import-time")
+    start = time.perf_counter()
+    proc = subprocess.run(args, cwd=cwd, env=env, capture_output=True, text=True)
+    return proc, (time.perf_counter() - start) * 1000
+
+
+def measure(name: str, repeat: int, top: int) -> dict:
+    directory, module, script, lazy = TARGETS[name]
+    probe = PROBE.format(module=module, lazy=lazy)
+    import_ms, wall_ms = [], []
+    modules: dict[str, tuple[int, int]] = {}
+    loaded: list[str] = []
+    for _ in range(repeat):
+        proc, elapsed = run([sys.executable, "-X", "importtime", "-c", probe], directory)
+        if proc.returncode != 0:
+            error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"
+            return {"target": name, "error": error}
+        modules = parse_importtime(proc.stderr)
+        loaded = json.loads(proc.stdout.strip().splitlines()[-1])
+        import_ms.append(modules[module][1] / 1000)
+        wall_ms.append(elapsed)
+
+    heaviest = sorted(
+        ((mod, cumulative) for mod, (_, cumulative) in modules.items() if "." not in mod and mod != module),
+        key=lambda item: item[1],
+        reverse=True,
+    )[:top]
+    result = {
+        "target": name,
+        "import_ms": round(statistics.median(import_ms), 1),
+        "wall_ms": round(statistics.median(wall_ms), 1),
+        "eager_imports": loaded,
+        "top_modules": [{"module": mod, "cumulative_ms": round(us / 1000, 1)} for mod, us in heaviest],
+    }
+    if script:
+        help_ms = []
+        for _ in range(repeat):
+            proc, elapsed = run([sys.executable, script, "--help"], directory)
+            if proc.returncode != 0:
+                result["help_error"] = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"
+                break
+            help_ms.append(elapsed)
+        if help_ms:
+            result["help_wall_ms"] = round(statistics.median(help_ms), 1)
+    return result
+
+
+def print_table(results: list[dict]) -> None:
+    for result in results:
+        if "error" in result:
+            print(f"{result['target']}: import に失敗しました ({result['error']})")
+            continue
+        line = f"{result['target']}: import {result['import_ms']} ms / プロセス全体 {result['wall_ms']} ms"
+        if "help_wall_ms" in result:
+            line += f" / --help {result['help_wall_ms']} ms"
+        print(line)
+        print(f"  起動時に読み込んだ重いライブラリ: {', '.join(result['eager_imports']) or 'なし'}")
+        for item in result["top_modules"]:
+            print(f"  {item['cumulative_ms']:>8.1f} ms  {item['module']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("targets", nargs="*", metavar="target",
+                        help=f"測る対象（{' / '.join(TARGETS)}、省略するとすべて）")
+    parser.add_argument("--repeat", type=int, default=5, help="測る回数（中央値を表示）")
+    parser.add_argument("--top", type=int, default=10, help="表示する時間のかかったモジュールの数")
+    parser.add_argument("--json", action="store_true", help="結果をJSONで出力する")
+    parser.add_argument("--check", action="store_true",
+                        help="使うときに import するはずのライブラリを起動時に読み込んでいたら終了コード1にする")
+    args = parser.parse_args()
+    unknown = [name for name in args.targets if name not in TARGETS]
+    if unknown:
+        parser.error(f"unknown target: {', '.join(unknown)}")
+
+    results = [measure(name, args.repeat, args.top) for name in (args.targets or TARGETS)]
+    if args.json:
+        print(json.dumps({"python": sys.version.split()[0], "results": results}, ensure_ascii=False, indent=2))
+    else:
+        print_table(results)
+
+    if args.check:
+        offenders = [r["target"] for r in results if "error" in r or r["eager_imports"]]
+        if offenders:
+            print(f"起動時間のチェックに失敗しました: {', '.join(offenders)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
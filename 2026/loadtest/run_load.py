@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""FlaskアプリのAPIに同時アクセスして、スループットとレイテンシを測る負荷試験ツール
+
+OpenAI APIの代わりに fake_openai.py のサーバーを起動し、アプリを同じプロセス内の
+WSGIサーバーで動かして、複数のクライアントから同時にリクエストを送ります。
+
+    python run_load.py mindmap --concurrency 32 --requests 400 --latency 1.5
+    python run_load.py text-to-mp4 --concurrency 4 --requests 20 --worker-threads 2
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from pathlib import Path
+
+from werkzeug.serving import make_server
+
+import fake_openai
+
+ROOT = Path(__file__).resolve().parent.parent
+APPS = {
+    "mindmap": ROOT / "mindmap_edit",
+    "text-to-mp4": ROOT / "text-to-mp4",
+}
+
+
+class Request:
+    def __init__(self, method: str, path: str, body: dict | None = None):
+        self.method = method
+        self.path = path
+        self.body = body
+
+
+def mindmap_requests(endpoints: list[str]):
+    counter = count()
+
+    def make(endpoint: str) -> Request:
+        n = next(counter)
+        if endpoint == "generate":
+            return Request("POST", "/api/generate", {"theme": f"テーマ{n}", "regenerate": True})
+        if endpoint == "generate_stream":
+            query = urllib.parse.urlencode({"theme": f"テーマ{n}", "regenerate": "1"})
+            return Request("GET", f"/api/generate_stream?{query}")
+        if endpoint == "expand":
+            return Request("POST", "/api/expand", {"topic": f"ノード{n}", "parentTopic": "親", "regenerate": True})
+        if endpoint == "expand_batch":
+            nodes = [{"id": f"{n}-{i}", "topic": f"ノード{n}-{i}", "parentTopic": "親"} for i in range(5)]
+            return Request("POST", "/api/expand_batch", {"nodes": nodes, "regenerate": True})
+        if endpoint == "load":
+            return Request("GET", "/api/maps")
+        raise ValueError(f"unknown endpoint: {endpoint}")
+
+    return make, endpoints or ["generate", "generate_stream", "expand", "expand_batch"]
+
+
+def text_to_mp4_requests(endpoints: list[str]):
+    counter = count()
+
+    def make(endpoint: str) -> Request:
+        n = next(counter)
+        if endpoint == "generate":
+            return Request("POST", "/generate", {"title": f"タイトル{n}", "text": "負荷試験の読み上げテキストです。"})
+        if endpoint == "index":
+            return Request("GET", "/")
+        raise ValueError(f"unknown endpoint: {endpoint}")
+
+    return make, endpoints or ["generate"]
+
+
+class WorkerLimit:
+    """WSGIミドルウェア: 同時に処理するリクエスト数をワーカーのスレッド数に制限する"""
+
+    def __init__(self, app, threads: int):
+        self.app = app
+        self.slots = threading.BoundedSemaphore(threads)
+
+    def __call__(self, environ, start_response):
+        self.slots.acquire()
+        try:
+            result = self.app(environ, start_response)
+        except BaseException:
+            self.slots.release()
+            raise
+        return _ReleasingIterable(result, self.slots)
+
+
+class _ReleasingIterable:
+    def __init__(self, iterable, slots):
+        self.iterable = iterable
+        self.slots = slots
+
+    def __iter__(self):
+        return iter(self.iterable)
+
+    def close(self):
+        try:
+            if hasattr(self.iterable, "close"):
+                self.iterable.close()
+        finally:
+            self.slots.release()
+
+
+def load_app(name: str, base_url: str):
+    app_dir = APPS[name]
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "sk-loadtest")
+    # キャッシュ・マップのDBなど試験中のデータはアプリのdata/ではなく一時ディレクトリに書く
+    # （app.pyは読み込んだ時点でDBを作るので、importより前に設定する）
+    os.environ["MINDMAP_DATA_DIR"] = tempfile.mkdtemp(prefix="loadtest-data-")
+    sys.path.insert(0, str(app_dir))
+    module = importlib.import_module("app")
+    return module.app
+
+
+def send(base: str, req: Request, timeout: float) -> tuple[bool, float]:
+    data = None
+    headers = {}
+    if req.body is not None:
+        if req.path == "/generate":
+            data = urllib.parse.urlencode(req.body).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        else:
+            data = json.dumps(req.body).encode()
+            headers["Content-Type"] = "application/json"
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(
+            urllib.request.Request(base + req.path, data=data, headers=headers, method=req.method), timeout=timeout
+        ) as res:
+            body = res.read()
+            ok = 200 <= res.status < 300 and b"event: fail" not in body
+    except (urllib.error.URLError, OSError):
+        ok = False
+    return ok, time.perf_counter() - start
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    # nearest-rank: 順位 ceil(p/100 * n) の値
+    index = min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="FlaskアプリのAPIに対する負荷試験")
+    parser.add_argument("app", choices=sorted(APPS))
+    parser.add_argument("--endpoints", nargs="*", default=[], help="試験するエンドポイント（省略時はすべて）")
+    parser.add_argument("--concurrency", type=int, default=16, help="同時に接続するクライアント数")
+    parser.add_argument("--requests", type=int, default=200, help="送信するリクエストの総数")
+    parser.add_argument("--worker-threads", type=int, default=0, help="アプリ側の同時処理数の上限（0は無制限）")
+    parser.add_argument("--timeout", type=float, default=120.0, help="1リクエストのタイムアウト（秒）")
+    parser.add_argument("--json", action="store_true", help="結果をJSONで出力する")
+    fake_openai.add_arguments(parser)
+    args = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    fake = fake_openai.start_server(fake_openai.settings_from_args(args))
+    base_url = f"http://127.0.0.1:{fake.server_address[1]}/v1"
+    flask_app = load_app(args.app, base_url)
+    wsgi = WorkerLimit(flask_app, args.worker_threads) if args.worker_threads > 0 else flask_app
+    server = make_server("127.0.0.1", 0, wsgi, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    app_base = f"http://127.0.0.1:{server.server_port}"
+
+    make, endpoints = (mindmap_requests if args.app == "mindmap" else text_to_mp4_requests)(args.endpoints)
+    plan = [(endpoints[i % len(endpoints)]) for i in range(args.requests)]
+    results: dict[str, list[tuple[bool, float]]] = {e: [] for e in endpoints}
+    lock = threading.Lock()
+
+    def run(endpoint: str) -> None:
+        outcome = send(app_base, make(endpoint), args.timeout)
+        with lock:
+            results[endpoint].append(outcome)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(run, plan))
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+    fake.shutdown()
+
+    report = {
+        "app": args.app,
+        "concurrency": args.concurrency,
+        "workerThreads": args.worker_threads or None,
+        "upstreamLatency": args.latency,
+        "elapsedSeconds": round(elapsed, 3),
+        "endpoints": {},
+    }
+    for endpoint, outcomes in results.items():
+        latencies = [t for _, t in outcomes]
+        errors = sum(1 for ok, _ in outcomes if not ok)
+        report["endpoints"][endpoint] = {
+            "requests": len(outcomes),
+            "throughputPerSec": round(len(outcomes) / elapsed, 2) if elapsed else 0.0,
+            "p50Ms": round(percentile(latencies, 50) * 1000, 1),
+            "p99Ms": round(percentile(latencies, 99) * 1000, 1),
+            "errorRate": round(errors / len(outcomes), 4) if outcomes else 0.0,
+        }
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+    print(f"{args.app}: {args.requests} requests, concurrency {args.concurrency}, {elapsed:.2f}s")
+    print(f"{'endpoint':<18}{'req':>6}{'req/s':>9}{'p50 ms':>10}{'p99 ms':>10}{'errors':>9}")
+    for endpoint, row in report["endpoints"].items():
+        print(
+            f"{endpoint:<18}{row['requests']:>6}{row['throughputPerSec']:>9}"
+            f"{row['p50Ms']:>10}{row['p99Ms']:>10}{row['errorRate']:>9.2%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,65 @@
+import contextvars
+import functools
 import json
 import os
 import re
+import time
 import uuid
-from datetime import datetime
+from collections.abc import Callable, Iterator, Mapping
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any, TypeVar
 
-from flask import Flask, jsonify, render_template, request
-from openai import OpenAI
+from flask import Flask, Response, jsonify, render_template, request, stream_with_context
+
+from httpcache import HTTPCache
+from journal import MindmapJournal, PatchError, VersionConflict
+from llm_cache import LLMCache
+from metrics import Metrics
+from store import MapNotFound, MapStore
+from stream_parser import IncrementalJSONParser
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+T = TypeVar("T")
 
 app = Flask(__name__)
 
-DATA_DIR = Path(__file__).parent / "data"
+DATA_DIR = Path(os.getenv("MINDMAP_DATA_DIR") or Path(__file__).parent / "data")
+# The single map saved by earlier versions; imported into MapStore while it is empty.
 SAVE_FILE = DATA_DIR / "mindmap_latest.json"
+JOURNAL_FILE = DATA_DIR / "mindmap_journal.jsonl"
+DB_FILE = DATA_DIR / "mindmaps.db"
+CACHE_DIR = DATA_DIR / "llm_cache"
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1-mini")
-client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
+SLOW_REQUEST_SECONDS = os.getenv("SLOW_REQUEST_SECONDS")
+EXPAND_CONCURRENCY = int(os.getenv("EXPAND_CONCURRENCY", 4))
+EXPAND_BATCH_LIMIT = 50
+MAX_BRANCHES = 8
+MAX_CHILDREN = 8
+metrics = Metrics(app, slow_request_seconds=float(SLOW_REQUEST_SECONDS) if SLOW_REQUEST_SECONDS else None)
+http_cache = HTTPCache(app)
+llm_cache = LLMCache(
+    CACHE_DIR,
+    ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", 7 * 24 * 3600)),
+    max_memory_entries=int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", 256)),
+    max_disk_entries=int(os.getenv("LLM_CACHE_DISK_ENTRIES", 2000)),
+)
+store = MapStore(DB_FILE)
+# Shared by all batch requests so the number of parallel model calls stays bounded.
+expand_executor = ThreadPoolExecutor(max_workers=EXPAND_CONCURRENCY, thread_name_prefix="expand")
+
+
+@functools.cache
+def get_client() -> "OpenAI | None":
+    """Creates the OpenAI client on first use (None without an API key); importing ``openai`` dominates cold start."""
+    if not OPENAI_API_KEY:
+        return None
+    from openai import OpenAI
+
+    return OpenAI(api_key=OPENAI_API_KEY)
 
 
 def _extract_json_object(text: str) -> dict[str, Any]:
@@ -37,34 +81,122 @@ def _safe_topic(text: Any, fallback: str) -> str:
     return cleaned[:80] if cleaned else fallback
 
 
-def _model_text(prompt: str, temperature: float = 0.7) -> str:
-    if client is None:
-        raise ValueError("OPENAI_API_KEY is not set.")
+def _cache_key(prompt: str, temperature: float) -> str:
+    return LLMCache.make_key(OPENAI_MODEL, prompt, temperature)
+
+
+def _cached_result(key: str, parse: Callable[[str], T]) -> T | None:
+    cached = llm_cache.get(key)
+    if cached is None:
+        return None
+    try:
+        return parse(cached)
+    except Exception:
+        # Cached before replies were checked: ask the model again and overwrite it.
+        return None
 
+
+def _remember_result(key: str, text: str, parse: Callable[[str], T]) -> T:
+    """Parses the reply and caches it only once that succeeded."""
+    result = parse(text)
+    llm_cache.set(key, text)
+    return result
+
+
+def _parses(text: str, parse: Callable[[str], Any]) -> bool:
+    try:
+        parse(text)
+    except Exception:
+        return False
+    return True
+
+
+def _model_request(
+    client: Any, prompt: str, temperature: float, stream: bool = False
+) -> tuple[Callable[..., Any], dict[str, Any]]:
+    """The ``create`` method and its arguments for a prompt; the same for ``OpenAI`` and ``AsyncOpenAI``."""
+    extra = {"stream": True} if stream else {}
     # Newer SDKs expose Responses API.
     if hasattr(client, "responses"):
-        response = client.responses.create(
-            model=OPENAI_MODEL,
-            input=prompt,
-            temperature=temperature,
-        )
-        return response.output_text or ""
-
+        return client.responses.create, {"model": OPENAI_MODEL, "input": prompt, "temperature": temperature, **extra}
     # Backward-compatible fallback for older SDK shapes.
-    completion = client.chat.completions.create(
-        model=OPENAI_MODEL,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=temperature,
-    )
-    if not completion.choices:
+    return client.chat.completions.create, {
+        "model": OPENAI_MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": temperature,
+        **extra,
+    }
+
+
+def _reply_text(response: Any) -> str:
+    if hasattr(response, "output_text"):
+        return response.output_text or ""
+    if not response.choices:
         return ""
-    return completion.choices[0].message.content or ""
+    return response.choices[0].message.content or ""
+
+
+def _delta_text(event: Any) -> str | None:
+    if getattr(event, "type", "") == "response.output_text.delta":
+        return event.delta
+    choices = getattr(event, "choices", None)
+    if choices:
+        return choices[0].delta.content
+    return None
+
+
+def _model_result(prompt: str, parse: Callable[[str], T], temperature: float = 0.7, use_cache: bool = True) -> T:
+    """Returns ``parse(reply)``; a reply is cached only once it has parsed."""
+    key = _cache_key(prompt, temperature)
+    if use_cache:
+        cached = _cached_result(key, parse)
+        if cached is not None:
+            return cached
+    return _remember_result(key, _call_model(prompt, temperature), parse)
+
+
+@metrics.timed("model_text")
+def _call_model(prompt: str, temperature: float) -> str:
+    client = get_client()
+    if client is None:
+        raise ValueError("OPENAI_API_KEY is not set.")
+    create, kwargs = _model_request(client, prompt, temperature)
+    return _reply_text(create(**kwargs))
+
+
+def _stream_model_text(
+    prompt: str, parse: Callable[[str], Any], temperature: float = 0.7, use_cache: bool = True
+) -> Iterator[str]:
+    """Yields the reply as it arrives; like ``_model_result``, only a reply that parses is cached."""
+    key = _cache_key(prompt, temperature)
+    if use_cache:
+        cached = llm_cache.get(key)
+        if cached is not None and _parses(cached, parse):
+            yield cached
+            return
+
+    client = get_client()
+    if client is None:
+        raise ValueError("OPENAI_API_KEY is not set.")
+
+    parts: list[str] = []
+    with metrics.stage("model_stream"):
+        create, kwargs = _model_request(client, prompt, temperature, stream=True)
+        for event in create(**kwargs):
+            delta = _delta_text(event)
+            if delta:
+                parts.append(delta)
+                yield delta
+
+    text = "".join(parts)
+    if _parses(text, parse):
+        llm_cache.set(key, text)
 
 
 def _build_jsmind_nodes(root_topic: str, tree_children: list[dict[str, Any]]) -> list[dict[str, str]]:
     nodes: list[dict[str, str]] = [{"id": "root", "isroot": True, "topic": _safe_topic(root_topic, "Main Topic")}]
 
-    for first_level in tree_children:
+    for first_level in tree_children[:MAX_BRANCHES]:
         parent_id = str(uuid.uuid4())
         parent_topic = _safe_topic(first_level.get("topic"), "Idea")
         nodes.append({"id": parent_id, "parentid": "root", "topic": parent_topic})
@@ -73,7 +205,7 @@ def _build_jsmind_nodes(root_topic: str, tree_children: list[dict[str, Any]]) ->
         if not isinstance(raw_children, list):
             continue
 
-        for child_topic in raw_children[:8]:
+        for child_topic in raw_children[:MAX_CHILDREN]:
             nodes.append(
                 {
                     "id": str(uuid.uuid4()),
@@ -98,41 +230,106 @@ def _fallback_map(theme: str) -> list[dict[str, str]]:
     ]
 
 
-def _generate_structure(theme: str) -> list[dict[str, str]]:
-    if client is None:
-        return _fallback_map(theme)
-
-    prompt = (
+def _structure_prompt(theme: str) -> str:
+    return (
         "You are generating a mind map. "
         "Return only valid JSON in this exact format: "
         '{"root":"...", "children":[{"topic":"...", "children":["...","..."]}]}. '
         "No markdown. Keep it concise. "
         f"Theme: {theme}"
     )
-    text = _model_text(prompt, temperature=0.7)
+
+
+class _StreamingMapBuilder:
+    """Turns parser events into jsMind nodes as soon as each one is complete."""
+
+    def __init__(self, theme: str) -> None:
+        self.theme = theme
+        self.root_sent = False
+        self.branch_ids: dict[int, str] = {}
+        self.pending_children: dict[int, list[str]] = {}
+
+    def _root(self, topic: Any) -> list[dict[str, Any]]:
+        self.root_sent = True
+        return [{"id": "root", "isroot": True, "topic": _safe_topic(topic, _safe_topic(self.theme, "Main Topic"))}]
+
+    def _branch(self, index: int, topic: Any) -> list[dict[str, Any]]:
+        nodes = [] if self.root_sent else self._root(self.theme)
+        branch_id = str(uuid.uuid4())
+        self.branch_ids[index] = branch_id
+        nodes.append({"id": branch_id, "parentid": "root", "topic": _safe_topic(topic, "Idea")})
+        for child in self.pending_children.pop(index, []):
+            nodes.append(self._child(branch_id, child))
+        return nodes
+
+    @staticmethod
+    def _child(parent_id: str, topic: Any) -> dict[str, Any]:
+        return {"id": str(uuid.uuid4()), "parentid": parent_id, "topic": _safe_topic(topic, "Sub idea")}
+
+    def handle(self, path: tuple[Any, ...], value: str) -> list[dict[str, Any]]:
+        if path == ("root",):
+            return [] if self.root_sent else self._root(value)
+        if len(path) < 3 or path[0] != "children" or not isinstance(path[1], int) or path[1] >= MAX_BRANCHES:
+            return []
+        index = path[1]
+        if path[2] == "topic" and len(path) == 3:
+            return [] if index in self.branch_ids else self._branch(index, value)
+        if path[2] == "children" and len(path) == 4 and isinstance(path[3], int) and path[3] < MAX_CHILDREN:
+            if index in self.branch_ids:
+                return [self._child(self.branch_ids[index], value)]
+            self.pending_children.setdefault(index, []).append(value)
+        return []
+
+    def finish(self) -> list[dict[str, Any]]:
+        nodes = [] if self.root_sent else self._root(self.theme)
+        for index in sorted(self.pending_children):
+            nodes.extend(self._branch(index, "Idea"))
+        return nodes
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _parse_structure(text: str, theme: str) -> list[dict[str, str]]:
     obj = _extract_json_object(text)
     root = _safe_topic(obj.get("root", theme), theme)
     children = obj.get("children", [])
     if not isinstance(children, list):
         raise ValueError("Invalid children format.")
-    return _build_jsmind_nodes(root, children[:8])
+    return _build_jsmind_nodes(root, children)
 
 
-def _expand_node_ideas(node_topic: str, parent_topic: str | None = None) -> list[str]:
-    if client is None:
-        return [
-            f"{node_topic} - Detail 1",
-            f"{node_topic} - Detail 2",
-            f"{node_topic} - Detail 3",
-        ]
+def _structure_request(theme: str) -> tuple[str, Callable[[str], list[dict[str, str]]], float]:
+    """Prompt, reply parser and temperature for a map about ``theme``."""
+    return _structure_prompt(theme), lambda text: _parse_structure(text, theme), 0.7
+
+
+def _generate_structure(theme: str, use_cache: bool = True) -> list[dict[str, str]]:
+    if get_client() is None:
+        return _fallback_map(theme)
+
+    return _model_result(*_structure_request(theme), use_cache=use_cache)
+
 
+def _fallback_ideas(node_topic: str) -> list[str]:
+    return [
+        f"{node_topic} - Detail 1",
+        f"{node_topic} - Detail 2",
+        f"{node_topic} - Detail 3",
+    ]
+
+
+def _expand_prompt(node_topic: str, parent_topic: str | None = None) -> str:
     relation = f" Parent topic: {parent_topic}." if parent_topic else ""
-    prompt = (
+    return (
         "Generate 3 to 6 concise child ideas for a mind map node. "
         "Return only a JSON array of strings, no markdown."
         f" Node topic: {node_topic}.{relation}"
     )
-    text = _model_text(prompt, temperature=0.8)
+
+
+def _parse_ideas(text: str, node_topic: str) -> list[str]:
     arr = _extract_json_array(text)
     ideas = []
     for item in arr[:6]:
@@ -142,6 +339,110 @@ def _expand_node_ideas(node_topic: str, parent_topic: str | None = None) -> list
     return ideas or [f"{node_topic} - New idea"]
 
 
+def _expand_request(node_topic: str, parent_topic: str | None = None) -> tuple[str, Callable[[str], list[str]], float]:
+    """Prompt, reply parser and temperature for the child ideas of a node."""
+    return _expand_prompt(node_topic, parent_topic), lambda text: _parse_ideas(text, node_topic), 0.8
+
+
+def _expand_node_ideas(node_topic: str, parent_topic: str | None = None, use_cache: bool = True) -> list[str]:
+    if get_client() is None:
+        return _fallback_ideas(node_topic)
+
+    return _model_result(*_expand_request(node_topic, parent_topic), use_cache=use_cache)
+
+
+class InvalidRequest(ValueError):
+    """A request to the model endpoints that is answered with 400."""
+
+
+def _generate_args(payload: Any) -> tuple[str, bool]:
+    """``(theme, use_cache)`` from a /api/generate body."""
+    payload = payload if isinstance(payload, dict) else {}
+    theme = str(payload.get("theme", "")).strip()
+    if not theme:
+        raise InvalidRequest("Theme is required.")
+    return theme, not payload.get("regenerate")
+
+
+def _generate_stream_args(query: Mapping[str, str]) -> tuple[str, bool]:
+    """``(theme, use_cache)`` from the /api/generate_stream query string."""
+    return _generate_args({"theme": query.get("theme", ""), "regenerate": query.get("regenerate") in ("1", "true")})
+
+
+def _expand_args(payload: Any) -> tuple[str, Any, bool]:
+    """``(topic, parent_topic, use_cache)`` from a /api/expand body."""
+    payload = payload if isinstance(payload, dict) else {}
+    node_topic = str(payload.get("topic", "")).strip()
+    if not node_topic:
+        raise InvalidRequest("Node topic is required.")
+    return node_topic, payload.get("parentTopic"), not payload.get("regenerate")
+
+
+def _expand_batch_args(payload: Any) -> tuple[list[dict[str, Any]], bool]:
+    """``(items, use_cache)`` from a /api/expand_batch body.
+
+    Each item has ``id``, ``topic`` and ``parentTopic``; a node without a topic
+    becomes its ``{"id", "error"}`` result instead, so the rest of the batch still runs.
+    """
+    payload = payload if isinstance(payload, dict) else {}
+    raw_nodes = payload.get("nodes")
+    if not isinstance(raw_nodes, list) or not raw_nodes:
+        raise InvalidRequest("Valid nodes are required.")
+    if len(raw_nodes) > EXPAND_BATCH_LIMIT:
+        raise InvalidRequest(f"At most {EXPAND_BATCH_LIMIT} nodes can be expanded at once.")
+
+    items = []
+    for raw in raw_nodes:
+        raw = raw if isinstance(raw, dict) else {}
+        try:
+            node_topic, parent_topic, _ = _expand_args(raw)
+        except InvalidRequest as exc:
+            items.append({"id": raw.get("id"), "error": str(exc)})
+            continue
+        items.append({"id": raw.get("id"), "topic": node_topic, "parentTopic": parent_topic})
+    return items, not payload.get("regenerate")
+
+
+def _generate_failed(exc: Exception) -> dict[str, str]:
+    return {"error": f"Failed to generate ideas: {exc}"}
+
+
+def _expand_failed(exc: Exception) -> dict[str, str]:
+    return {"error": f"Failed to expand ideas: {exc}"}
+
+
+class _GenerateEvents:
+    """Turns streamed reply text into the SSE events of /api/generate_stream."""
+
+    def __init__(self, theme: str) -> None:
+        self.started = time.perf_counter()
+        self.count = 0
+        self.parser = IncrementalJSONParser()
+        self.builder = _StreamingMapBuilder(theme)
+
+    def _nodes(self, nodes: list[dict[str, Any]]) -> list[str]:
+        events = []
+        for node in nodes:
+            if self.count == 0:
+                metrics.observe_stage("stream_first_node", time.perf_counter() - self.started)
+            self.count += 1
+            events.append(_sse("node", node))
+        return events
+
+    def feed(self, delta: str) -> list[str]:
+        return self._nodes(
+            [node for path, value in self.parser.feed(delta) for node in self.builder.handle(path, value)]
+        )
+
+    def finish(self) -> list[str]:
+        return self._nodes(self.builder.finish()) + [_sse("done", {"count": self.count})]
+
+
+def _fallback_events(theme: str) -> list[str]:
+    nodes = _fallback_map(theme)
+    return [_sse("node", node) for node in nodes] + [_sse("done", {"count": len(nodes)})]
+
+
 @app.route("/")
 def index():
     return render_template("index.html")
@@ -149,62 +450,267 @@ def index():
 
 @app.route("/api/generate", methods=["POST"])
 def api_generate():
-    payload = request.get_json(silent=True) or {}
-    theme = str(payload.get("theme", "")).strip()
-    if not theme:
-        return jsonify({"error": "Theme is required."}), 400
+    try:
+        theme, use_cache = _generate_args(request.get_json(silent=True))
+    except InvalidRequest as exc:
+        return jsonify({"error": str(exc)}), 400
 
     try:
-        nodes = _generate_structure(theme)
+        nodes = _generate_structure(theme, use_cache=use_cache)
     except Exception as exc:
-        return jsonify({"error": f"Failed to generate ideas: {exc}"}), 500
+        return jsonify(_generate_failed(exc)), 500
 
     return jsonify({"nodes": nodes})
 
 
+@app.route("/api/generate_stream", methods=["GET"])
+def api_generate_stream():
+    try:
+        theme, use_cache = _generate_stream_args(request.args)
+    except InvalidRequest as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    def events() -> Iterator[str]:
+        if get_client() is None:
+            yield from _fallback_events(theme)
+            return
+
+        stream = _GenerateEvents(theme)
+        try:
+            for delta in _stream_model_text(*_structure_request(theme), use_cache=use_cache):
+                yield from stream.feed(delta)
+            finished = stream.finish()
+        except Exception as exc:
+            yield _sse("fail", _generate_failed(exc))
+            return
+        yield from finished
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.route("/api/expand", methods=["POST"])
 def api_expand():
-    payload = request.get_json(silent=True) or {}
-    node_topic = str(payload.get("topic", "")).strip()
-    parent_topic = payload.get("parentTopic")
-    if not node_topic:
-        return jsonify({"error": "Node topic is required."}), 400
+    try:
+        node_topic, parent_topic, use_cache = _expand_args(request.get_json(silent=True))
+    except InvalidRequest as exc:
+        return jsonify({"error": str(exc)}), 400
 
     try:
-        ideas = _expand_node_ideas(node_topic, parent_topic)
+        ideas = _expand_node_ideas(node_topic, parent_topic, use_cache=use_cache)
     except Exception as exc:
-        return jsonify({"error": f"Failed to expand ideas: {exc}"}), 500
+        return jsonify(_expand_failed(exc)), 500
 
     return jsonify({"ideas": ideas})
 
 
-@app.route("/api/save", methods=["POST"])
-def api_save():
+@app.route("/api/expand_batch", methods=["POST"])
+def api_expand_batch():
+    try:
+        items, use_cache = _expand_batch_args(request.get_json(silent=True))
+    except InvalidRequest as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    futures = {}
+    for i, item in enumerate(items):
+        if "error" in item:
+            continue
+        # Run in a copy of the request's context so the worker's model_text stages
+        # are recorded against this request (metrics reads them from ``g``).
+        futures[i] = expand_executor.submit(
+            contextvars.copy_context().run, _expand_node_ideas, item["topic"], item["parentTopic"], use_cache
+        )
+
+    results = []
+    for i, item in enumerate(items):
+        if i not in futures:
+            results.append(item)
+            continue
+        try:
+            results.append({"id": item["id"], "ideas": futures[i].result()})
+        except Exception as exc:
+            results.append({"id": item["id"], **_expand_failed(exc)})
+
+    return jsonify({"results": results})
+
+
+def _int_arg(name: str, default: int | None, maximum: int | None = None, minimum: int | None = None) -> int | None:
+    raw = request.args.get(name)
+    if raw is None or raw == "":
+        return default
+    value = int(raw)
+    if maximum is not None:
+        value = min(value, maximum)
+    if minimum is not None:
+        value = max(value, minimum)
+    return value
+
+
+def _valid_nodes(nodes: Any) -> bool:
+    """A non-empty node array whose nodes are dicts with an ``id``, exactly one of them the root."""
+    if not isinstance(nodes, list) or not nodes:
+        return False
+    for node in nodes:
+        if not isinstance(node, dict) or not isinstance(node.get("id"), (str, int)) or node["id"] == "":
+            return False
+        if not isinstance(node.get("parentid"), (str, int, type(None))):
+            return False
+    return sum(1 for node in nodes if node.get("isroot")) == 1
+
+
+def _load_legacy_map() -> list[dict[str, Any]]:
+    if not SAVE_FILE.exists() and not JOURNAL_FILE.exists():
+        return []
+    nodes, _, _ = MindmapJournal(SAVE_FILE, JOURNAL_FILE).load()
+    return nodes if _valid_nodes(nodes) else []
+
+
+def import_legacy_map() -> str | None:
+    """Copies the map saved by earlier versions into MapStore when the store has no maps yet."""
+    if store.list_maps(limit=1)[0]:
+        return None
+    try:
+        nodes = _load_legacy_map()
+    except PatchError as exc:
+        app.logger.warning("Could not import %s: %s", JOURNAL_FILE, exc)
+        return None
+    if not nodes:
+        return None
+    map_id, _, _ = store.create_map(nodes)
+    return map_id
+
+
+import_legacy_map()
+
+
+@app.route("/api/maps", methods=["GET"])
+def api_list_maps():
+    try:
+        limit = _int_arg("limit", 20, maximum=100, minimum=1)
+        maps, next_cursor = store.list_maps(limit=limit, cursor=request.args.get("cursor"))
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    return jsonify({"maps": maps, "nextCursor": next_cursor})
+
+
+@app.route("/api/maps", methods=["POST"])
+def api_create_map():
     payload = request.get_json(silent=True) or {}
     nodes = payload.get("nodes")
-    if not isinstance(nodes, list) or not nodes:
+    if not _valid_nodes(nodes):
         return jsonify({"error": "Valid nodes are required."}), 400
 
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    document = {
-        "savedAt": datetime.utcnow().isoformat() + "Z",
-        "nodes": nodes,
-    }
-    SAVE_FILE.write_text(json.dumps(document, ensure_ascii=False, indent=2), encoding="utf-8")
-    return jsonify({"message": "Saved", "savedAt": document["savedAt"]})
+    map_id, version, saved_at = store.create_map(nodes)
+    return jsonify({"id": map_id, "version": version, "savedAt": saved_at}), 201
 
 
-@app.route("/api/load", methods=["GET"])
-def api_load():
-    if not SAVE_FILE.exists():
-        return jsonify({"nodes": []})
+@app.route("/api/maps/<map_id>", methods=["GET"])
+def api_get_map(map_id: str):
+    try:
+        return jsonify(store.load_map(map_id, version=_int_arg("version", None)))
+    except ValueError:
+        return jsonify({"error": "version must be an integer."}), 400
+    except MapNotFound:
+        return jsonify({"error": "Map not found."}), 404
+
+
+@app.route("/api/maps/<map_id>", methods=["PUT"])
+def api_put_map(map_id: str):
+    payload = request.get_json(silent=True) or {}
+    nodes = payload.get("nodes")
+    base_version = payload.get("baseVersion")
+    if not _valid_nodes(nodes):
+        return jsonify({"error": "Valid nodes are required."}), 400
+    if base_version is not None and (not isinstance(base_version, int) or isinstance(base_version, bool)):
+        return jsonify({"error": "baseVersion must be an integer."}), 400
 
     try:
-        payload = json.loads(SAVE_FILE.read_text(encoding="utf-8"))
-        nodes = payload.get("nodes", [])
-        return jsonify({"nodes": nodes, "savedAt": payload.get("savedAt")})
-    except Exception:
-        return jsonify({"nodes": [], "savedAt": None})
+        version, saved_at = store.save_map(map_id, nodes, base_version)
+    except MapNotFound:
+        return jsonify({"error": "Map not found."}), 404
+    except VersionConflict as exc:
+        return jsonify({"error": str(exc), "version": exc.version}), 409
+    return jsonify({"message": "Saved", "savedAt": saved_at, "version": version})
+
+
+@app.route("/api/maps/<map_id>", methods=["DELETE"])
+def api_delete_map(map_id: str):
+    try:
+        store.delete_map(map_id)
+    except MapNotFound:
+        return jsonify({"error": "Map not found."}), 404
+    return jsonify({"message": "Deleted"})
+
+
+@app.route("/api/maps/<map_id>/patch", methods=["POST"])
+def api_patch_map(map_id: str):
+    payload = request.get_json(silent=True) or {}
+    base_version = payload.get("baseVersion")
+    ops = payload.get("ops")
+    if not isinstance(base_version, int) or not isinstance(ops, list) or not ops:
+        return jsonify({"error": "baseVersion and ops are required."}), 400
+
+    try:
+        version, saved_at = store.apply_patch(map_id, base_version, ops)
+    except MapNotFound:
+        return jsonify({"error": "Map not found."}), 404
+    except VersionConflict as exc:
+        return jsonify({"error": str(exc), "version": exc.version}), 409
+    except PatchError as exc:
+        return jsonify({"error": f"Invalid patch: {exc}"}), 400
+    return jsonify({"message": "Saved", "savedAt": saved_at, "version": version})
+
+
+@app.route("/api/maps/<map_id>/nodes/<node_id>", methods=["GET"])
+def api_get_subtree(map_id: str, node_id: str):
+    try:
+        nodes = store.load_subtree(map_id, node_id, depth=_int_arg("depth", None, minimum=0))
+    except ValueError:
+        return jsonify({"error": "depth must be an integer."}), 400
+    except MapNotFound:
+        return jsonify({"error": "Map not found."}), 404
+    if not nodes:
+        return jsonify({"error": "Node not found."}), 404
+    return jsonify({"nodes": nodes})
+
+
+@app.route("/api/maps/<map_id>/versions", methods=["GET"])
+def api_list_versions(map_id: str):
+    try:
+        versions = store.list_versions(
+            map_id, limit=_int_arg("limit", 20, maximum=100, minimum=1), before=_int_arg("before", None)
+        )
+    except ValueError:
+        return jsonify({"error": "limit and before must be integers."}), 400
+    except MapNotFound:
+        return jsonify({"error": "Map not found."}), 404
+    return jsonify({"versions": versions})
+
+
+@app.route("/api/search", methods=["GET"])
+def api_search():
+    query = str(request.args.get("q", "")).strip()
+    if not query:
+        return jsonify({"error": "q is required."}), 400
+    try:
+        limit = _int_arg("limit", 20, maximum=100, minimum=1)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer."}), 400
+    return jsonify({"hits": store.search(query, limit=limit)})
+
+
+@app.cli.command("import-latest")
+def import_latest():
+    """Copy data/mindmap_latest.json into the SQLite store as a new map."""
+    nodes = _load_legacy_map()
+    if not nodes:
+        print("No saved map to import.")
+        return
+    map_id, version, _ = store.create_map(nodes)
+    print(f"Imported {len(nodes)} nodes as map {map_id} (version {version}).")
 
 
 if __name__ == "__main__":
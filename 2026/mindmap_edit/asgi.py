@@ -0,0 +1,288 @@
+"""ASGI entry point that keeps many slow model calls in flight without a thread each.
+
+The LLM endpoints (/api/generate, /api/generate_stream, /api/expand and
+/api/expand_batch) are served here with ``AsyncOpenAI``. Every other route is
+the Flask app from ``app.py`` running in a WSGI thread pool (a2wsgi). Request
+validation, prompts and reply parsing are the ones ``app.py`` uses.
+
+    uvicorn asgi:app
+
+Upstream calls share one semaphore (``UPSTREAM_CONCURRENCY``), each request
+gives up after ``MODEL_TIMEOUT_SECONDS`` and the model call is cancelled as
+soon as the client disconnects.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import TYPE_CHECKING, Any, TypeVar
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+
+import app as mindmap
+from asgi_helpers import ClientDisconnected, Receive, Scope, Send, json_endpoint, lifespan, send_json, until_disconnect
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+T = TypeVar("T")
+
+UPSTREAM_CONCURRENCY = int(os.getenv("UPSTREAM_CONCURRENCY", 64))
+MODEL_TIMEOUT_SECONDS = float(os.getenv("MODEL_TIMEOUT_SECONDS", 60))
+WSGI_THREADS = int(os.getenv("WSGI_THREADS", 10))
+TIMEOUT_MESSAGE = "The model did not respond in time."
+
+# Shared by every request in this process, like expand_executor in app.py.
+upstream_slots = asyncio.Semaphore(UPSTREAM_CONCURRENCY)
+wsgi_app = WSGIMiddleware(mindmap.app, workers=WSGI_THREADS)
+
+_async_client: AsyncOpenAI | None = None
+
+
+def get_async_client() -> AsyncOpenAI | None:
+    """Creates the client on first use (None without an API key), so importing this module stays cheap."""
+    global _async_client
+    if _async_client is None and mindmap.OPENAI_API_KEY:
+        from openai import AsyncOpenAI
+
+        _async_client = AsyncOpenAI(api_key=mindmap.OPENAI_API_KEY)
+    return _async_client
+
+
+def _remaining(deadline: float) -> float:
+    return max(0.0, deadline - asyncio.get_running_loop().time())
+
+
+async def _call_model(prompt: str, temperature: float) -> str:
+    async_client = get_async_client()
+    if async_client is None:
+        raise ValueError("OPENAI_API_KEY is not set.")
+    create, kwargs = mindmap._model_request(async_client, prompt, temperature)
+    return mindmap._reply_text(await create(**kwargs))
+
+
+async def _model_result(
+    prompt: str, parse: Callable[[str], T], temperature: float = 0.7, use_cache: bool = True
+) -> T:
+    """Async ``app._model_result``: returns ``parse(reply)`` and caches only replies that parse."""
+    key = mindmap._cache_key(prompt, temperature)
+    if use_cache:
+        cached = await asyncio.to_thread(mindmap._cached_result, key, parse)
+        if cached is not None:
+            return cached
+
+    async def call() -> str:
+        async with upstream_slots:
+            with mindmap.metrics.stage("model_text"):
+                return await _call_model(prompt, temperature)
+
+    # The timeout covers waiting for a free slot as well as the call itself.
+    text = await asyncio.wait_for(call(), MODEL_TIMEOUT_SECONDS)
+    return await asyncio.to_thread(mindmap._remember_result, key, text, parse)
+
+
+async def _stream_model_text(
+    prompt: str, parse: Callable[[str], Any], temperature: float = 0.7, use_cache: bool = True
+) -> AsyncIterator[str]:
+    """Async ``app._stream_model_text`` with a deadline on every read from the upstream stream."""
+    key = mindmap._cache_key(prompt, temperature)
+    if use_cache:
+        cached = await asyncio.to_thread(mindmap.llm_cache.get, key)
+        if cached is not None and mindmap._parses(cached, parse):
+            yield cached
+            return
+
+    async_client = get_async_client()
+    if async_client is None:
+        raise ValueError("OPENAI_API_KEY is not set.")
+
+    deadline = asyncio.get_running_loop().time() + MODEL_TIMEOUT_SECONDS
+    await asyncio.wait_for(upstream_slots.acquire(), _remaining(deadline))
+    parts: list[str] = []
+    started = time.perf_counter()
+    try:
+        create, kwargs = mindmap._model_request(async_client, prompt, temperature, stream=True)
+        stream = await asyncio.wait_for(create(**kwargs), _remaining(deadline))
+        try:
+            events = stream.__aiter__()
+            while True:
+                try:
+                    event = await asyncio.wait_for(events.__anext__(), _remaining(deadline))
+                except StopAsyncIteration:
+                    break
+                delta = mindmap._delta_text(event)
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        finally:
+            await stream.close()
+    finally:
+        upstream_slots.release()
+        mindmap.metrics.observe_stage("model_stream", time.perf_counter() - started)
+
+    text = "".join(parts)
+    if mindmap._parses(text, parse):
+        await asyncio.to_thread(mindmap.llm_cache.set, key, text)
+
+
+async def _expand_node_ideas(node_topic: str, parent_topic: str | None = None, use_cache: bool = True) -> list[str]:
+    if get_async_client() is None:
+        return mindmap._fallback_ideas(node_topic)
+
+    return await _model_result(*mindmap._expand_request(node_topic, parent_topic), use_cache=use_cache)
+
+
+async def api_generate(payload: Any) -> tuple[int, dict[str, Any]]:
+    try:
+        theme, use_cache = mindmap._generate_args(payload)
+    except mindmap.InvalidRequest as exc:
+        return 400, {"error": str(exc)}
+    if get_async_client() is None:
+        return 200, {"nodes": mindmap._fallback_map(theme)}
+
+    try:
+        nodes = await _model_result(*mindmap._structure_request(theme), use_cache=use_cache)
+    except asyncio.TimeoutError:
+        return 504, {"error": TIMEOUT_MESSAGE}
+    except Exception as exc:
+        return 500, mindmap._generate_failed(exc)
+
+    return 200, {"nodes": nodes}
+
+
+async def api_expand(payload: Any) -> tuple[int, dict[str, Any]]:
+    try:
+        node_topic, parent_topic, use_cache = mindmap._expand_args(payload)
+    except mindmap.InvalidRequest as exc:
+        return 400, {"error": str(exc)}
+
+    try:
+        ideas = await _expand_node_ideas(node_topic, parent_topic, use_cache=use_cache)
+    except asyncio.TimeoutError:
+        return 504, {"error": TIMEOUT_MESSAGE}
+    except Exception as exc:
+        return 500, mindmap._expand_failed(exc)
+
+    return 200, {"ideas": ideas}
+
+
+async def api_expand_batch(payload: Any) -> tuple[int, dict[str, Any]]:
+    try:
+        items, use_cache = mindmap._expand_batch_args(payload)
+    except mindmap.InvalidRequest as exc:
+        return 400, {"error": str(exc)}
+
+    async def expand_one(item: dict[str, Any]) -> dict[str, Any]:
+        if "error" in item:
+            return item
+        try:
+            ideas = await _expand_node_ideas(item["topic"], item["parentTopic"], use_cache=use_cache)
+        except asyncio.TimeoutError:
+            return {"id": item["id"], "error": TIMEOUT_MESSAGE}
+        except Exception as exc:
+            return {"id": item["id"], **mindmap._expand_failed(exc)}
+        return {"id": item["id"], "ideas": ideas}
+
+    results = await asyncio.gather(*(expand_one(item) for item in items))
+    return 200, {"results": results}
+
+
+async def _generate_events(send: Send, theme: str, use_cache: bool) -> None:
+    async def emit(events: list[str]) -> None:
+        for event in events:
+            await send({"type": "http.response.body", "body": event.encode("utf-8"), "more_body": True})
+
+    if get_async_client() is None:
+        await emit(mindmap._fallback_events(theme))
+        return
+
+    stream = mindmap._GenerateEvents(theme)
+    try:
+        async for delta in _stream_model_text(*mindmap._structure_request(theme), use_cache=use_cache):
+            await emit(stream.feed(delta))
+        finished = stream.finish()
+    except asyncio.TimeoutError:
+        await emit([mindmap._sse("fail", {"error": TIMEOUT_MESSAGE})])
+        return
+    except Exception as exc:
+        await emit([mindmap._sse("fail", mindmap._generate_failed(exc))])
+        return
+    await emit(finished)
+
+
+async def _generate_stream_endpoint(scope: Scope, receive: Receive, send: Send) -> None:
+    query = {name: values[0] for name, values in parse_qs(scope["query_string"].decode("latin-1")).items()}
+    with mindmap.metrics.track_request("GET", "/api/generate_stream") as tracked:
+        try:
+            theme, use_cache = mindmap._generate_stream_args(query)
+        except mindmap.InvalidRequest as exc:
+            tracked["status"] = 400
+            await send_json(send, 400, {"error": str(exc)})
+            return
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream; charset=utf-8"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no"),
+                ],
+            }
+        )
+        try:
+            await until_disconnect(receive, _generate_events(send, theme, use_cache))
+        except ClientDisconnected:
+            tracked["status"] = 499
+            return
+        tracked["status"] = 200
+        await send({"type": "http.response.body", "body": b""})
+
+
+JSONHandler = Callable[[Any], Awaitable[tuple[int, dict[str, Any]]]]
+
+
+def _json_route(handler: JSONHandler) -> Callable[[bytes], Awaitable[tuple[int, dict[str, Any]]]]:
+    """Adapts a handler of the decoded JSON body (None if it is not JSON) to ``json_endpoint``."""
+
+    async def run(body: bytes) -> tuple[int, dict[str, Any]]:
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            payload = None
+        return await handler(payload)
+
+    return run
+
+
+JSON_ROUTES = {
+    "/api/generate": _json_route(api_generate),
+    "/api/expand": _json_route(api_expand),
+    "/api/expand_batch": _json_route(api_expand_batch),
+}
+
+
+async def _close_client() -> None:
+    if _async_client is not None:
+        await _async_client.close()
+
+
+async def app(scope: Scope, receive: Receive, send: Send) -> None:
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send, _close_client)
+        return
+    if scope["type"] == "http":
+        path = scope["path"]
+        if scope["method"] == "POST" and path in JSON_ROUTES:
+            await json_endpoint(mindmap.metrics, "POST", path, JSON_ROUTES[path], receive, send)
+            return
+        if scope["method"] == "GET" and path == "/api/generate_stream":
+            await _generate_stream_endpoint(scope, receive, send)
+            return
+    await wsgi_app(scope, receive, send)
@@ -0,0 +1,94 @@
+"""Benchmark for the SQLite map store with large maps.
+
+Usage:
+    python bench/bench_store.py --nodes 10000 --maps 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from store import MapStore  # noqa: E402
+
+
+def make_nodes(count: int, fanout: int = 8) -> list[dict]:
+    nodes = [{"id": "root", "isroot": True, "topic": "Benchmark root", "expanded": True}]
+    for i in range(1, count):
+        parent = nodes[(i - 1) // fanout]["id"]
+        nodes.append({"id": f"n{i}", "parentid": parent, "topic": f"アイデア {i}", "expanded": True})
+    return nodes
+
+
+def timed(fn, repeat: int) -> dict[str, float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {"p50_ms": round(statistics.median(samples), 2), "max_ms": round(max(samples), 2)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=10000, help="nodes per large map")
+    parser.add_argument("--maps", type=int, default=200, help="number of small maps to list")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MapStore(Path(tmp) / "bench.db")
+        nodes = make_nodes(args.nodes)
+        small = make_nodes(50)
+        for _ in range(args.maps):
+            store.create_map(small)
+
+        results: dict[str, object] = {"nodes": args.nodes, "maps": args.maps}
+        start = time.perf_counter()
+        map_id, version, _ = store.create_map(nodes)
+        results["create_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        results["load"] = timed(lambda: store.load_map(map_id), args.repeat)
+        results["load_subtree"] = timed(lambda: store.load_subtree(map_id, "n1"), args.repeat)
+        results["load_subtree_depth1"] = timed(lambda: store.load_subtree(map_id, "n1", depth=1), args.repeat)
+
+        def patch() -> None:
+            nonlocal version
+            target = f"n{random.randrange(1, args.nodes)}"
+            ops = [{"op": "update", "id": target, "fields": {"topic": f"edited {time.time()}"}}]
+            version, _ = store.apply_patch(map_id, version, ops)
+
+        results["patch_one_node"] = timed(patch, args.repeat)
+
+        def save_one_percent() -> None:
+            nonlocal version
+            for node in random.sample(nodes[1:], max(1, len(nodes) // 100)):
+                node["topic"] = f"changed {time.time()}"
+            version, _ = store.save_map(map_id, nodes)
+
+        results["full_save_1pct_changed"] = timed(save_one_percent, args.repeat)
+        results["load_old_version"] = timed(lambda: store.load_map(map_id, version=1), args.repeat)
+        results["search_rare"] = timed(lambda: store.search("アイデア 1234"), args.repeat)
+        results["search_common"] = timed(lambda: store.search("アイデア 12"), args.repeat)
+        results["list_maps_page"] = timed(lambda: store.list_maps(limit=20), args.repeat)
+
+        def walk_pages() -> None:
+            cursor = None
+            while True:
+                _, cursor = store.list_maps(limit=50, cursor=cursor)
+                if cursor is None:
+                    break
+
+        results["list_all_pages"] = timed(walk_pages, args.repeat)
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
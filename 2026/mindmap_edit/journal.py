@@ -0,0 +1,316 @@
+"""Snapshot + append-only journal storage for the single saved mind map.
+
+This is the format earlier versions saved to; ``app.py`` now imports it into
+``MapStore`` on first start. The patch ops and errors are shared with ``store.py``.
+"""
+
+from __future__ import annotations
+
+import copy
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+
+class PatchError(ValueError):
+    pass
+
+
+class VersionConflict(Exception):
+    def __init__(self, version: int) -> None:
+        super().__init__(f"Map was changed elsewhere (current version {version}).")
+        self.version = version
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _fsync_dir(path: Path) -> None:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _write_temp_json(path: Path, document: dict[str, Any]) -> str:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            json.dump(document, fh, ensure_ascii=False, separators=(",", ":"))
+            fh.flush()
+            os.fsync(fh.fileno())
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+    return tmp_name
+
+
+def write_json_atomic(path: Path, document: dict[str, Any]) -> None:
+    os.replace(_write_temp_json(path, document), path)
+    _fsync_dir(path.parent)
+
+
+def apply_ops(nodes: dict[str, dict[str, Any]], ops: list[Any]) -> None:
+    """Applies add/update/move/delete ops to ``nodes`` (id -> node) in place."""
+    for op in ops:
+        if not isinstance(op, dict):
+            raise PatchError("Each op must be an object.")
+        kind = op.get("op")
+        if kind == "add":
+            node = op.get("node")
+            if not isinstance(node, dict) or not node.get("id"):
+                raise PatchError("add requires a node with an id.")
+            node_id = str(node["id"])
+            if node_id in nodes:
+                raise PatchError(f"Node {node_id} already exists.")
+            parent_id = node.get("parentid")
+            # Ids are compared as strings, like the node keys (and MapStore).
+            if parent_id is None or str(parent_id) not in nodes:
+                raise PatchError(f"Parent of node {node_id} does not exist.")
+            nodes[node_id] = dict(node, id=node_id, parentid=str(parent_id))
+        elif kind == "update":
+            node = nodes.get(str(op.get("id")))
+            fields = op.get("fields")
+            if node is None or not isinstance(fields, dict):
+                raise PatchError("update requires an existing id and fields.")
+            for key, value in fields.items():
+                if key in ("id", "parentid", "isroot"):
+                    continue
+                if value is None:
+                    node.pop(key, None)
+                else:
+                    node[key] = value
+        elif kind == "move":
+            node_id = str(op.get("id"))
+            parent_id = None if op.get("parentid") is None else str(op.get("parentid"))
+            node = nodes.get(node_id)
+            if node is None or node.get("isroot") or parent_id not in nodes:
+                raise PatchError("move requires an existing non-root node and parent.")
+            ancestor = parent_id
+            while ancestor is not None:
+                if ancestor == node_id:
+                    raise PatchError("A node cannot be moved under its own descendant.")
+                ancestor = nodes[ancestor].get("parentid")
+            node["parentid"] = parent_id
+            if "direction" in op:
+                node["direction"] = op["direction"]
+        elif kind == "delete":
+            node_id = str(op.get("id"))
+            node = nodes.get(node_id)
+            if node is None:
+                # Already removed together with a deleted ancestor.
+                continue
+            if node.get("isroot"):
+                raise PatchError("The root node cannot be deleted.")
+            children: dict[Any, list[str]] = {}
+            for other_id, other in nodes.items():
+                children.setdefault(other.get("parentid"), []).append(other_id)
+            stack = [node_id]
+            while stack:
+                current = stack.pop()
+                stack.extend(children.get(current, []))
+                del nodes[current]
+        else:
+            raise PatchError(f"Unknown op: {kind!r}")
+
+
+class MindmapJournal:
+    """Keeps the saved map as a snapshot file plus a journal of patches.
+
+    Patches are appended to the journal and flushed immediately. ``fsync`` is
+    batched: a background thread syncs the journal at most every
+    ``fsync_interval`` seconds. Once the journal holds ``compact_after`` entries
+    it is folded into a new snapshot in the background. Snapshots are always
+    written to a temporary file and renamed into place.
+    """
+
+    def __init__(
+        self,
+        snapshot_path: Path,
+        journal_path: Path,
+        *,
+        fsync_interval: float = 0.2,
+        compact_after: int = 200,
+    ) -> None:
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.fsync_interval = fsync_interval
+        self.compact_after = compact_after
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._nodes: dict[str, dict[str, Any]] = {}
+        self._version = 0
+        self._snapshot_version = 0
+        self._saved_at: str | None = None
+        self._journal_entries = 0
+        self._journal_fh: Any = None
+        self._needs_sync = False
+        self._compacting = False
+        self._wake = threading.Event()
+        self._worker = threading.Thread(target=self._background, name="mindmap-journal", daemon=True)
+        self._worker.start()
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        nodes: list[dict[str, Any]] = []
+        if self.snapshot_path.exists():
+            try:
+                document = json.loads(self.snapshot_path.read_text(encoding="utf-8"))
+                nodes = document.get("nodes", [])
+                self._version = int(document.get("version", 0))
+                self._snapshot_version = self._version
+                self._saved_at = document.get("savedAt")
+            except (OSError, ValueError):
+                nodes = []
+        self._nodes = {str(n["id"]): n for n in nodes if isinstance(n, dict) and "id" in n}
+
+        entries = 0
+        if self.journal_path.exists():
+            good_bytes = 0
+            with self.journal_path.open("rb") as fh:
+                for line in fh:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn final line from an interrupted write: cut it off so
+                        # the next append starts on a clean line.
+                        os.truncate(self.journal_path, good_bytes)
+                        break
+                    good_bytes += len(line)
+                    entries += 1
+                    if entry["version"] <= self._version:
+                        continue
+                    apply_ops(self._nodes, entry["ops"])
+                    self._version = entry["version"]
+                    self._saved_at = entry["savedAt"]
+        self._journal_entries = entries
+        self._loaded = True
+
+    def load(self) -> tuple[list[dict[str, Any]], int, str | None]:
+        with self._lock:
+            self._ensure_loaded()
+            return copy.deepcopy(list(self._nodes.values())), self._version, self._saved_at
+
+    def replace(self, nodes: list[dict[str, Any]]) -> tuple[int, str]:
+        with self._lock:
+            self._ensure_loaded()
+            self._version += 1
+            self._saved_at = _now()
+            self._nodes = {str(n["id"]): n for n in copy.deepcopy(nodes) if isinstance(n, dict) and "id" in n}
+            write_json_atomic(
+                self.snapshot_path,
+                {"savedAt": self._saved_at, "version": self._version, "nodes": list(self._nodes.values())},
+            )
+            self._snapshot_version = self._version
+            self._truncate_journal()
+            return self._version, self._saved_at
+
+    def apply_patch(self, base_version: int, ops: list[Any]) -> tuple[int, str]:
+        with self._lock:
+            self._ensure_loaded()
+            if base_version != self._version:
+                raise VersionConflict(self._version)
+            staged = copy.deepcopy(self._nodes)
+            apply_ops(staged, ops)
+
+            version = self._version + 1
+            saved_at = _now()
+            line = json.dumps({"version": version, "savedAt": saved_at, "ops": ops}, ensure_ascii=False)
+            fh = self._journal()
+            fh.write(line + "\n")
+            fh.flush()
+
+            self._nodes = staged
+            self._version = version
+            self._saved_at = saved_at
+            self._journal_entries += 1
+            self._needs_sync = True
+            if self._journal_entries >= self.compact_after:
+                self._wake.set()
+            return version, saved_at
+
+    def _journal(self) -> Any:
+        if self._journal_fh is None:
+            self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+            self._journal_fh = self.journal_path.open("a", encoding="utf-8")
+        return self._journal_fh
+
+    def _truncate_journal(self, keep: list[str] | None = None) -> None:
+        if self._journal_fh is not None:
+            self._journal_fh.close()
+            self._journal_fh = None
+        keep = keep or []
+        fd, tmp_name = tempfile.mkstemp(dir=self.journal_path.parent, prefix=self.journal_path.name, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            fh.writelines(keep)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_name, self.journal_path)
+        _fsync_dir(self.journal_path.parent)
+        self._journal_entries = len(keep)
+        self._needs_sync = False
+
+    def _background(self) -> None:
+        while True:
+            self._wake.wait(self.fsync_interval)
+            self._wake.clear()
+            with self._lock:
+                if self._needs_sync and self._journal_fh is not None:
+                    os.fsync(self._journal_fh.fileno())
+                    self._needs_sync = False
+                should_compact = self._loaded and self._journal_entries >= self.compact_after
+            if should_compact:
+                self.compact()
+
+    def compact(self) -> None:
+        """Folds the journal into a new snapshot without blocking saves while writing."""
+        with self._lock:
+            if self._compacting:
+                return
+            self._ensure_loaded()
+            self._compacting = True
+            version = self._version
+            document = {
+                "savedAt": self._saved_at,
+                "version": version,
+                "nodes": copy.deepcopy(list(self._nodes.values())),
+            }
+        try:
+            tmp_name = _write_temp_json(self.snapshot_path, document)
+            with self._lock:
+                if self._snapshot_version >= version:
+                    # A full save replaced the snapshot while this one was being written.
+                    Path(tmp_name).unlink(missing_ok=True)
+                    return
+                os.replace(tmp_name, self.snapshot_path)
+                _fsync_dir(self.snapshot_path.parent)
+                self._snapshot_version = version
+                if self._journal_fh is not None:
+                    self._journal_fh.flush()
+                keep: list[str] = []
+                if self.journal_path.exists():
+                    with self.journal_path.open(encoding="utf-8") as fh:
+                        for line in fh:
+                            try:
+                                entry = json.loads(line)
+                            except ValueError:
+                                break
+                            if entry["version"] > version:
+                                keep.append(line)
+                self._truncate_journal(keep)
+        finally:
+            with self._lock:
+                self._compacting = False
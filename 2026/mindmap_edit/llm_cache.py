@@ -0,0 +1,108 @@
+"""Two-tier (memory LRU + on-disk) cache for model responses."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+
+class LLMCache:
+    """Caches model output keyed by (model, prompt, temperature).
+
+    Entries live in an in-memory LRU and in one JSON file per entry under
+    ``cache_dir``. Both tiers expire entries after ``ttl_seconds`` and evict the
+    least recently used entries once they exceed their size limit.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        *,
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_memory_entries: int = 256,
+        max_disk_entries: int = 2000,
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model: str, prompt: str, temperature: float) -> str:
+        raw = json.dumps([model, prompt, round(float(temperature), 4)], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _expired(self, created_at: float) -> bool:
+        return time.time() - created_at > self.ttl_seconds
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[0]):
+                    self._memory.move_to_end(key)
+                    return entry[1]
+                del self._memory[key]
+
+        path = self._path(key)
+        try:
+            record = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        created_at = float(record.get("createdAt", 0))
+        if self._expired(created_at):
+            path.unlink(missing_ok=True)
+            return None
+        text = str(record.get("text", ""))
+        # Touch the file so disk eviction follows access order, not write order.
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        self._remember(key, created_at, text)
+        return text
+
+    def set(self, key: str, text: str) -> None:
+        created_at = time.time()
+        self._remember(key, created_at, text)
+
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            json.dump({"createdAt": created_at, "text": text}, fh, ensure_ascii=False)
+        os.replace(tmp_name, path)
+        self._evict_disk()
+
+    def _remember(self, key: str, created_at: float, text: str) -> None:
+        with self._lock:
+            self._memory[key] = (created_at, text)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def _evict_disk(self) -> None:
+        files = list(self.cache_dir.glob("*/*.json"))
+        overflow = len(files) - self.max_disk_entries
+        if overflow <= 0:
+            return
+        aged = []
+        for path in files:
+            try:
+                aged.append((path.stat().st_mtime, path))
+            except OSError:
+                continue
+        aged.sort()
+        for _, path in aged[:overflow]:
+            path.unlink(missing_ok=True)
@@ -2,10 +2,22 @@ const statusEl = document.getElementById("status");
 const themeInput = document.getElementById("themeInput");
 const saveBtn = document.getElementById("saveBtn");
 const loadBtn = document.getElementById("loadBtn");
+const mapSelect = document.getElementById("mapSelect");
+const searchInput = document.getElementById("searchInput");
+const searchResults = document.getElementById("searchResults");
+const expandLevelBtn = document.getElementById("expandLevelBtn");
 const container = document.getElementById("jsmind_container");
 
 let jm = null;
 let expandingNodeIds = new Set();
+// Map in the SQLite store that is being edited (null until a new map is first saved).
+let currentMapId = null;
+// Last state known to be on the server, used to send only the changes on save.
+let savedVersion = null;
+let savedNodes = new Map();
+let searchTimer = null;
+// Bumped for every search so that a slow, older response cannot replace newer results.
+let searchSeq = 0;
 
 function isImeComposing(event) {
   return event.isComposing || event.keyCode === 229;
@@ -55,20 +67,59 @@ function ensureSelectedNode() {
   return node;
 }
 
-async function generateFromTheme(theme) {
+function generateFromTheme(theme, regenerate = false) {
   setStatus("アイデアを生成中...");
-  const res = await fetch("/api/generate", {
-    method: "POST",
-    headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ theme }),
+  const params = new URLSearchParams({ theme });
+  if (regenerate) params.set("regenerate", "1");
+
+  return new Promise((resolve, reject) => {
+    const source = new EventSource(`/api/generate_stream?${params}`);
+    let received = 0;
+
+    source.addEventListener("node", (event) => {
+      const node = JSON.parse(event.data);
+      if (node.isroot) {
+        createMind([node]);
+      } else if (jm && jm.get_node(node.parentid)) {
+        jm.add_node(node.parentid, node.id, node.topic);
+      }
+      received += 1;
+      setStatus(`アイデアを生成中... (${received}件)`);
+    });
+
+    source.addEventListener("done", () => {
+      source.close();
+      setStatus("生成完了。Enterで編集、Shift+Enterで追加、ダブルクリックでAI展開");
+      resolve();
+    });
+
+    source.addEventListener("fail", (event) => {
+      source.close();
+      reject(new Error(JSON.parse(event.data).error || "生成に失敗しました"));
+    });
+
+    source.onerror = () => {
+      source.close();
+      reject(new Error("生成に失敗しました"));
+    };
   });
-  const data = await res.json();
-  if (!res.ok) throw new Error(data.error || "生成に失敗しました");
-  createMind(data.nodes);
-  setStatus("生成完了。Enterで編集、Shift+Enterで追加、ダブルクリックでAI展開");
 }
 
-async function expandNode(nodeId, topic) {
+function addIdeas(nodeId, ideas) {
+  const node = jm.get_node(nodeId);
+  if (!node) return 0;
+  const existingChildren = new Set((node.children || []).map((c) => c.topic));
+  let added = 0;
+  for (const idea of ideas || []) {
+    if (!existingChildren.has(idea)) {
+      jm.add_node(nodeId, uid(), idea);
+      added += 1;
+    }
+  }
+  return added;
+}
+
+async function expandNode(nodeId, topic, regenerate = false) {
   if (expandingNodeIds.has(nodeId)) return;
   expandingNodeIds.add(nodeId);
   setStatus(`"${topic}" を展開中...`);
@@ -80,24 +131,61 @@ async function expandNode(nodeId, topic) {
     const res = await fetch("/api/expand", {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ topic, parentTopic: parent }),
+      body: JSON.stringify({ topic, parentTopic: parent, regenerate }),
+    });
+    const data = await res.json();
+    if (!res.ok) throw new Error(data.error || "展開に失敗しました");
+
+    const added = addIdeas(nodeId, data.ideas);
+    setStatus(added ? `${added}件の子ノードを追加しました` : "追加できる新規アイデアがありませんでした");
+  } catch (err) {
+    setStatus(err.message || "展開処理でエラーが発生しました", true);
+  } finally {
+    expandingNodeIds.delete(nodeId);
+  }
+}
+
+async function expandLevel(regenerate = false) {
+  const node = ensureSelectedNode();
+  if (!node) return;
+  const targets = (node.children && node.children.length ? node.children : [node]).filter(
+    (n) => !expandingNodeIds.has(n.id)
+  );
+  if (!targets.length) return;
+  targets.forEach((n) => expandingNodeIds.add(n.id));
+  setStatus(`${targets.length}件のノードを一括展開中...`);
+
+  try {
+    const res = await fetch("/api/expand_batch", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({
+        nodes: targets.map((n) => ({
+          id: n.id,
+          topic: n.topic,
+          parentTopic: n.parent ? n.parent.topic : null,
+        })),
+        regenerate,
+      }),
     });
     const data = await res.json();
     if (!res.ok) throw new Error(data.error || "展開に失敗しました");
 
-    const existingChildren = new Set((node.children || []).map((c) => c.topic));
     let added = 0;
-    for (const idea of data.ideas || []) {
-      if (!existingChildren.has(idea)) {
-        jm.add_node(nodeId, uid(), idea);
-        added += 1;
+    let failed = 0;
+    for (const result of data.results || []) {
+      if (result.error) {
+        failed += 1;
+        continue;
       }
+      added += addIdeas(result.id, result.ideas);
     }
-    setStatus(added ? `${added}件の子ノードを追加しました` : "追加できる新規アイデアがありませんでした");
+    const message = `${added}件の子ノードを追加しました`;
+    setStatus(failed ? `${message}（${failed}件は展開に失敗）` : message, failed > 0);
   } catch (err) {
     setStatus(err.message || "展開処理でエラーが発生しました", true);
   } finally {
-    expandingNodeIds.delete(nodeId);
+    targets.forEach((n) => expandingNodeIds.delete(n.id));
   }
 }
 
@@ -105,7 +193,7 @@ function bindHotkeys() {
   document.addEventListener("keydown", (e) => {
     if (isImeComposing(e)) return;
     if (!jm) return;
-    if (document.activeElement === themeInput) return;
+    if (document.activeElement === themeInput || document.activeElement === searchInput) return;
 
     if (e.key === "Enter" && e.shiftKey) {
       e.preventDefault();
@@ -136,8 +224,55 @@ function bindDoubleClickExpand() {
     if (!nodeId) return;
     const node = jm.get_node(nodeId);
     if (!node) return;
-    await expandNode(nodeId, node.topic);
+    await expandNode(nodeId, node.topic, e.shiftKey);
+  });
+}
+
+function rememberSaved(nodes, version) {
+  savedVersion = version;
+  savedNodes = new Map(nodes.map((n) => [n.id, JSON.stringify(n)]));
+}
+
+function diffNodes(nodes) {
+  const ops = [];
+  const current = new Set();
+  for (const node of nodes) {
+    current.add(node.id);
+    const before = savedNodes.get(node.id);
+    if (before === undefined) {
+      ops.push({ op: "add", node });
+      continue;
+    }
+    const prev = JSON.parse(before);
+    if ((prev.parentid ?? null) !== (node.parentid ?? null)) {
+      ops.push({ op: "move", id: node.id, parentid: node.parentid, direction: node.direction });
+    }
+    const fields = {};
+    for (const key of new Set([...Object.keys(prev), ...Object.keys(node)])) {
+      if (key === "id" || key === "parentid") continue;
+      if (JSON.stringify(prev[key]) !== JSON.stringify(node[key])) fields[key] = node[key] ?? null;
+    }
+    if (Object.keys(fields).length) ops.push({ op: "update", id: node.id, fields });
+  }
+  for (const id of savedNodes.keys()) {
+    if (!current.has(id)) ops.push({ op: "delete", id });
+  }
+  return ops;
+}
+
+function startNewMap() {
+  currentMapId = null;
+  rememberSaved([], null);
+  mapSelect.value = "";
+}
+
+async function sendJson(method, url, body) {
+  const res = await fetch(url, {
+    method,
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(body),
   });
+  return { res, data: await res.json() };
 }
 
 async function saveMind() {
@@ -146,29 +281,145 @@ async function saveMind() {
     return;
   }
   const nodes = jm.get_data("node_array").data;
-  const res = await fetch("/api/save", {
-    method: "POST",
-    headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ nodes }),
-  });
-  const data = await res.json();
+  let result = null;
+
+  if (currentMapId === null) {
+    result = await sendJson("POST", "/api/maps", { nodes });
+    if (result.res.ok) currentMapId = result.data.id;
+  } else {
+    const mapUrl = `/api/maps/${encodeURIComponent(currentMapId)}`;
+    if (savedVersion !== null) {
+      const ops = diffNodes(nodes);
+      if (!ops.length) {
+        setStatus("変更はありません");
+        return;
+      }
+      // A patch only pays off while it is smaller than the map itself.
+      if (ops.length < nodes.length / 2) {
+        result = await sendJson("POST", `${mapUrl}/patch`, { baseVersion: savedVersion, ops });
+        if (result.res.status === 409 || result.res.status === 400) result = null;
+      }
+    }
+    if (!result) {
+      result = await sendJson("PUT", mapUrl, { nodes });
+    }
+  }
+
+  const { res, data } = result;
   if (!res.ok) throw new Error(data.error || "保存に失敗しました");
+  rememberSaved(nodes, data.version);
+  await refreshMapList();
   setStatus(`保存しました (${new Date(data.savedAt).toLocaleString()})`);
 }
 
-async function loadMind() {
-  const res = await fetch("/api/load");
+async function refreshMapList() {
+  const res = await fetch("/api/maps?limit=100");
+  const data = await res.json();
+  if (!res.ok) throw new Error(data.error || "マップ一覧の取得に失敗しました");
+
+  mapSelect.replaceChildren(new Option("（新しいマップ）", ""));
+  for (const map of data.maps || []) {
+    mapSelect.add(new Option(map.title || "(無題)", map.id));
+  }
+  mapSelect.value = currentMapId ?? "";
+  return data.maps || [];
+}
+
+async function loadMap(mapId) {
+  const res = await fetch(`/api/maps/${encodeURIComponent(mapId)}`);
   const data = await res.json();
   if (!res.ok) throw new Error(data.error || "読み込みに失敗しました");
-  if (!data.nodes || data.nodes.length === 0) {
-    createMind([{ id: "root", isroot: true, topic: "MindEdit" }]);
+  createMind(data.nodes);
+  currentMapId = data.id;
+  mapSelect.value = data.id;
+  rememberSaved(jm.get_data("node_array").data, data.version);
+  setStatus(`「${data.title}」を読み込みました`);
+}
+
+function showInitialMap() {
+  createMind([{ id: "root", isroot: true, topic: "MindEdit" }]);
+  startNewMap();
+}
+
+async function loadLatestMap() {
+  const maps = await refreshMapList();
+  if (!maps.length) {
+    showInitialMap();
     setStatus("保存データがないため初期マップを表示");
     return;
   }
-  createMind(data.nodes);
-  setStatus("保存データを読み込みました");
+  await loadMap(maps[0].id);
+}
+
+function hideSearchResults() {
+  searchResults.hidden = true;
+  searchResults.replaceChildren();
 }
 
+function renderSearchResults(hits) {
+  if (!hits.length) {
+    const empty = document.createElement("li");
+    empty.textContent = "見つかりませんでした";
+    searchResults.replaceChildren(empty);
+    searchResults.hidden = false;
+    return;
+  }
+  searchResults.replaceChildren(
+    ...hits.map((hit) => {
+      const item = document.createElement("li");
+      const path = document.createElement("span");
+      path.className = "path";
+      path.textContent = hit.path.length ? hit.path.join(" › ") : hit.mapTitle;
+      item.append(hit.topic, path);
+      item.addEventListener("click", () => openSearchHit(hit));
+      return item;
+    })
+  );
+  searchResults.hidden = false;
+}
+
+async function searchMaps(query) {
+  const seq = ++searchSeq;
+  const params = new URLSearchParams({ q: query, limit: "20" });
+  const res = await fetch(`/api/search?${params}`);
+  const data = await res.json();
+  if (seq !== searchSeq) return;
+  if (!res.ok) throw new Error(data.error || "検索に失敗しました");
+  renderSearchResults(data.hits || []);
+}
+
+async function openSearchHit(hit) {
+  hideSearchResults();
+  try {
+    if (hit.mapId !== currentMapId) await loadMap(hit.mapId);
+    jm.select_node(hit.nodeId);
+    setStatus(`「${hit.topic}」を選択しました`);
+  } catch (err) {
+    setStatus(err.message || "読み込み処理でエラーが発生しました", true);
+  }
+}
+
+searchInput.addEventListener("input", () => {
+  clearTimeout(searchTimer);
+  const query = searchInput.value.trim();
+  if (!query) {
+    searchSeq += 1;
+    hideSearchResults();
+    return;
+  }
+  searchTimer = setTimeout(() => {
+    searchMaps(query).catch((err) => setStatus(err.message || "検索処理でエラーが発生しました", true));
+  }, 250);
+});
+
+searchInput.addEventListener("keydown", (e) => {
+  if (e.key === "Escape") hideSearchResults();
+});
+
+document.addEventListener("click", (e) => {
+  if (!e.target.closest(".search")) hideSearchResults();
+});
+
 themeInput.addEventListener("keydown", async (e) => {
   if (isImeComposing(e)) return;
   if (e.key !== "Enter") return;
@@ -179,7 +430,8 @@ themeInput.addEventListener("keydown", async (e) => {
     return;
   }
   try {
-    await generateFromTheme(theme);
+    startNewMap();
+    await generateFromTheme(theme, e.shiftKey);
   } catch (err) {
     setStatus(err.message || "生成処理でエラーが発生しました", true);
   }
@@ -193,9 +445,31 @@ saveBtn.addEventListener("click", async () => {
   }
 });
 
+expandLevelBtn.addEventListener("click", async (e) => {
+  if (!jm) return;
+  await expandLevel(e.shiftKey);
+});
+
 loadBtn.addEventListener("click", async () => {
   try {
-    await loadMind();
+    if (currentMapId === null) {
+      await loadLatestMap();
+    } else {
+      await loadMap(currentMapId);
+    }
+  } catch (err) {
+    setStatus(err.message || "読み込み処理でエラーが発生しました", true);
+  }
+});
+
+mapSelect.addEventListener("change", async () => {
+  try {
+    if (mapSelect.value) {
+      await loadMap(mapSelect.value);
+    } else {
+      showInitialMap();
+      setStatus("新しいマップを作成中です。保存すると一覧に追加されます");
+    }
   } catch (err) {
     setStatus(err.message || "読み込み処理でエラーが発生しました", true);
   }
@@ -203,4 +477,4 @@ loadBtn.addEventListener("click", async () => {
 
 bindHotkeys();
 bindDoubleClickExpand();
-loadMind().catch(() => createMind([{ id: "root", isroot: true, topic: "MindEdit" }]));
+loadLatestMap().catch(showInitialMap);
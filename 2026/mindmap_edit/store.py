@@ -0,0 +1,621 @@
+"""SQLite storage for many mind maps with cheap version history."""
+
+from __future__ import annotations
+
+import base64
+import json
+import sqlite3
+import threading
+import unicodedata
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterator
+
+from journal import PatchError, VersionConflict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS maps (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    node_count INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS maps_by_updated ON maps (updated_at DESC, id DESC);
+
+-- Each row is one state of a node, valid for versions [valid_from, valid_to).
+-- valid_to IS NULL marks the current state, so a save only touches changed nodes.
+CREATE TABLE IF NOT EXISTS nodes (
+    map_id TEXT NOT NULL,
+    node_id TEXT NOT NULL,
+    parent_id TEXT,
+    position INTEGER NOT NULL,
+    topic TEXT NOT NULL,
+    data TEXT NOT NULL,
+    valid_from INTEGER NOT NULL,
+    valid_to INTEGER
+);
+CREATE UNIQUE INDEX IF NOT EXISTS nodes_current ON nodes (map_id, node_id) WHERE valid_to IS NULL;
+CREATE INDEX IF NOT EXISTS nodes_current_children ON nodes (map_id, parent_id) WHERE valid_to IS NULL;
+CREATE INDEX IF NOT EXISTS nodes_history ON nodes (map_id, node_id, valid_from);
+
+-- Inverted index of character uni/bigrams over current node topics.
+CREATE TABLE IF NOT EXISTS topic_grams (
+    gram TEXT NOT NULL,
+    map_id TEXT NOT NULL,
+    node_id TEXT NOT NULL,
+    PRIMARY KEY (gram, map_id, node_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS topic_grams_by_node ON topic_grams (map_id, node_id);
+
+CREATE TABLE IF NOT EXISTS versions (
+    map_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    saved_at TEXT NOT NULL,
+    node_count INTEGER NOT NULL,
+    PRIMARY KEY (map_id, version)
+);
+"""
+
+_NODE_COLUMNS = ("id", "parentid", "topic")
+_UNBOUNDED_DEPTH = 1 << 30
+_SCHEMA_VERSION = 1
+_GRAM_COUNT_CAP = 1000
+# Very common queries (a single kana, say) are ranked among the shortest
+# matching topics only, since shorter topics score higher anyway.
+_SEARCH_CANDIDATE_LIMIT = 2000
+
+
+class MapNotFound(LookupError):
+    pass
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _encode_cursor(updated_at: str, map_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{updated_at}|{map_id}".encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        updated_at, map_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+    except Exception as exc:
+        raise ValueError("Invalid cursor.") from exc
+    return updated_at, map_id
+
+
+def _to_row(node: dict[str, Any], position: int) -> tuple[str | None, int, str, str]:
+    extra = {k: v for k, v in node.items() if k not in _NODE_COLUMNS}
+    parent = node.get("parentid")
+    return (
+        None if parent is None else str(parent),
+        position,
+        str(node.get("topic", "")),
+        json.dumps(extra, ensure_ascii=False, sort_keys=True),
+    )
+
+
+def _from_row(node_id: str, parent_id: str | None, topic: str, data: str) -> dict[str, Any]:
+    node: dict[str, Any] = {"id": node_id, "topic": topic}
+    node.update(json.loads(data))
+    if parent_id is not None:
+        node["parentid"] = parent_id
+    return node
+
+
+def normalize_text(text: str) -> str:
+    return "".join(unicodedata.normalize("NFKC", text).lower().split())
+
+
+def text_grams(text: str) -> set[str]:
+    """Character unigrams and bigrams, which work for Japanese without a tokenizer."""
+    normalized = normalize_text(text)
+    grams = set(normalized)
+    grams.update(normalized[i : i + 2] for i in range(len(normalized) - 1))
+    return grams
+
+
+def _sibling_positions(nodes: list[dict[str, Any]]) -> list[int]:
+    # Positions count within each parent, so appending a child does not shift
+    # (and therefore rewrite) every node that comes after it.
+    seen: dict[Any, int] = {}
+    positions = []
+    for node in nodes:
+        parent = node.get("parentid")
+        positions.append(seen.get(parent, 0))
+        seen[parent] = positions[-1] + 1
+    return positions
+
+
+class MapStore:
+    """Keeps mind maps in SQLite (WAL mode) with one row per node state."""
+
+    def __init__(self, db_path: Path) -> None:
+        self.db_path = db_path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        if conn.execute("PRAGMA user_version").fetchone()[0] < _SCHEMA_VERSION:
+            self._build_search_index()
+
+    def _build_search_index(self) -> None:
+        # One-off for databases created before the search index existed.
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM topic_grams")
+            rows = conn.execute("SELECT map_id, node_id, topic FROM nodes WHERE valid_to IS NULL").fetchall()
+            for map_id, node_id, topic in rows:
+                self._index_node(conn, map_id, node_id, topic)
+            conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+    @staticmethod
+    def _index_node(conn: sqlite3.Connection, map_id: str, node_id: str, topic: str) -> None:
+        conn.executemany(
+            "INSERT OR IGNORE INTO topic_grams (gram, map_id, node_id) VALUES (?, ?, ?)",
+            [(gram, map_id, node_id) for gram in text_grams(topic)],
+        )
+
+    @staticmethod
+    def _unindex_nodes(conn: sqlite3.Connection, map_id: str, node_ids: list[str]) -> None:
+        conn.executemany(
+            "DELETE FROM topic_grams WHERE map_id = ? AND node_id = ?",
+            [(map_id, node_id) for node_id in node_ids],
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _current_rows(self, conn: sqlite3.Connection, map_id: str) -> dict[str, tuple[Any, ...]]:
+        rows = conn.execute(
+            "SELECT node_id, parent_id, position, topic, data FROM nodes WHERE map_id = ? AND valid_to IS NULL",
+            (map_id,),
+        )
+        return {row[0]: row[1:] for row in rows}
+
+    def _map_version(self, conn: sqlite3.Connection, map_id: str) -> int:
+        row = conn.execute("SELECT version FROM maps WHERE id = ?", (map_id,)).fetchone()
+        if row is None:
+            raise MapNotFound(map_id)
+        return row[0]
+
+    def _write_version(
+        self,
+        conn: sqlite3.Connection,
+        map_id: str,
+        version: int,
+        current: dict[str, tuple[Any, ...]],
+        nodes: list[dict[str, Any]],
+    ) -> tuple[int, str] | None:
+        """Writes the rows that differ from ``current``. Returns None when nothing changed."""
+        wanted: dict[str, tuple[Any, ...]] = {}
+        for node, position in zip(nodes, _sibling_positions(nodes)):
+            wanted[str(node["id"])] = _to_row(node, position)
+
+        changed = [node_id for node_id, row in wanted.items() if current.get(node_id) != row]
+        removed = [node_id for node_id in current if node_id not in wanted]
+        if version > 0 and not changed and not removed:
+            return None
+
+        new_version = version + 1
+        saved_at = _now()
+        closing = [node_id for node_id in changed if node_id in current] + removed
+        conn.executemany(
+            "UPDATE nodes SET valid_to = ? WHERE map_id = ? AND node_id = ? AND valid_to IS NULL",
+            [(new_version, map_id, node_id) for node_id in closing],
+        )
+        conn.executemany(
+            "INSERT INTO nodes (map_id, node_id, parent_id, position, topic, data, valid_from, valid_to) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, NULL)",
+            [(map_id, node_id, *wanted[node_id], new_version) for node_id in changed],
+        )
+        reindex = [node_id for node_id in changed if node_id not in current or current[node_id][2] != wanted[node_id][2]]
+        self._unindex_nodes(conn, map_id, [n for n in reindex if n in current] + removed)
+        for node_id in reindex:
+            self._index_node(conn, map_id, node_id, wanted[node_id][2])
+        root = next((n for n in nodes if n.get("isroot")), nodes[0] if nodes else {})
+        title = str(root.get("topic", ""))[:200]
+        conn.execute(
+            "INSERT INTO maps (id, title, version, node_count, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET title = excluded.title, version = excluded.version, "
+            "node_count = excluded.node_count, updated_at = excluded.updated_at",
+            (map_id, title, new_version, len(wanted), saved_at, saved_at),
+        )
+        conn.execute(
+            "INSERT INTO versions (map_id, version, saved_at, node_count) VALUES (?, ?, ?, ?)",
+            (map_id, new_version, saved_at, len(wanted)),
+        )
+        return new_version, saved_at
+
+    def create_map(self, nodes: list[dict[str, Any]]) -> tuple[str, int, str]:
+        map_id = uuid.uuid4().hex
+        with self._transaction() as conn:
+            version, saved_at = self._write_version(conn, map_id, 0, {}, nodes)  # type: ignore[misc]
+        return map_id, version, saved_at
+
+    def save_map(
+        self, map_id: str, nodes: list[dict[str, Any]], base_version: int | None = None
+    ) -> tuple[int, str | None]:
+        with self._transaction() as conn:
+            version = self._map_version(conn, map_id)
+            if base_version is not None and base_version != version:
+                raise VersionConflict(version)
+            result = self._write_version(conn, map_id, version, self._current_rows(conn, map_id), nodes)
+        return result if result is not None else (version, None)
+
+    def apply_patch(self, map_id: str, base_version: int, ops: list[Any]) -> tuple[int, str | None]:
+        """Applies add/update/move/delete ops touching only the affected rows."""
+        with self._transaction() as conn:
+            version = self._map_version(conn, map_id)
+            if base_version != version:
+                raise VersionConflict(version)
+            new_version = version + 1
+            delta = 0
+            for op in ops:
+                delta += self._apply_op(conn, map_id, new_version, op)
+
+            saved_at = _now()
+            root = conn.execute(
+                "SELECT topic FROM nodes WHERE map_id = ? AND parent_id IS NULL AND valid_to IS NULL LIMIT 1",
+                (map_id,),
+            ).fetchone()
+            conn.execute(
+                "UPDATE maps SET version = ?, node_count = node_count + ?, updated_at = ?, title = ? WHERE id = ?",
+                (new_version, delta, saved_at, (root[0] if root else "")[:200], map_id),
+            )
+            conn.execute(
+                "INSERT INTO versions (map_id, version, saved_at, node_count) "
+                "SELECT id, version, updated_at, node_count FROM maps WHERE id = ?",
+                (map_id,),
+            )
+        return new_version, saved_at
+
+    def _node_row(self, conn: sqlite3.Connection, map_id: str, node_id: Any) -> tuple[Any, ...] | None:
+        return conn.execute(
+            "SELECT parent_id, position, topic, data, valid_from FROM nodes "
+            "WHERE map_id = ? AND node_id = ? AND valid_to IS NULL",
+            (map_id, str(node_id)),
+        ).fetchone()
+
+    def _next_position(self, conn: sqlite3.Connection, map_id: str, parent_id: str) -> int:
+        row = conn.execute(
+            "SELECT MAX(position) FROM nodes WHERE map_id = ? AND parent_id = ? AND valid_to IS NULL",
+            (map_id, parent_id),
+        ).fetchone()
+        return 0 if row[0] is None else row[0] + 1
+
+    def _put_node(
+        self,
+        conn: sqlite3.Connection,
+        map_id: str,
+        node_id: str,
+        row: tuple[Any, ...],
+        new_version: int,
+        previous_from: int | None,
+        previous_topic: str | None = None,
+    ) -> None:
+        if previous_topic != row[2]:
+            if previous_topic is not None:
+                self._unindex_nodes(conn, map_id, [node_id])
+            self._index_node(conn, map_id, node_id, row[2])
+        if previous_from == new_version:
+            # Already rewritten earlier in this patch: update that row in place.
+            conn.execute(
+                "UPDATE nodes SET parent_id = ?, position = ?, topic = ?, data = ? "
+                "WHERE map_id = ? AND node_id = ? AND valid_to IS NULL",
+                (*row, map_id, node_id),
+            )
+            return
+        if previous_from is not None:
+            conn.execute(
+                "UPDATE nodes SET valid_to = ? WHERE map_id = ? AND node_id = ? AND valid_to IS NULL",
+                (new_version, map_id, node_id),
+            )
+        conn.execute(
+            "INSERT INTO nodes (map_id, node_id, parent_id, position, topic, data, valid_from, valid_to) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, NULL)",
+            (map_id, node_id, *row, new_version),
+        )
+
+    def _apply_op(self, conn: sqlite3.Connection, map_id: str, new_version: int, op: Any) -> int:
+        """Applies one op and returns the change in node count."""
+        if not isinstance(op, dict):
+            raise PatchError("Each op must be an object.")
+        kind = op.get("op")
+        if kind == "add":
+            node = op.get("node")
+            if not isinstance(node, dict) or not node.get("id"):
+                raise PatchError("add requires a node with an id.")
+            node_id = str(node["id"])
+            if self._node_row(conn, map_id, node_id) is not None:
+                raise PatchError(f"Node {node_id} already exists.")
+            parent_id = node.get("parentid")
+            if parent_id is None or self._node_row(conn, map_id, parent_id) is None:
+                raise PatchError(f"Parent of node {node_id} does not exist.")
+            row = _to_row(node, self._next_position(conn, map_id, str(parent_id)))
+            self._put_node(conn, map_id, node_id, row, new_version, None)
+            return 1
+
+        if kind == "update":
+            node_id = str(op.get("id"))
+            current = self._node_row(conn, map_id, node_id)
+            fields = op.get("fields")
+            if current is None or not isinstance(fields, dict):
+                raise PatchError("update requires an existing id and fields.")
+            node = _from_row(node_id, current[0], current[2], current[3])
+            for key, value in fields.items():
+                if key in ("id", "parentid", "isroot"):
+                    continue
+                if value is None:
+                    node.pop(key, None)
+                else:
+                    node[key] = value
+            row = _to_row(node, current[1])
+            self._put_node(conn, map_id, node_id, row, new_version, current[4], current[2])
+            return 0
+
+        if kind == "move":
+            node_id = str(op.get("id"))
+            parent_id = op.get("parentid")
+            current = self._node_row(conn, map_id, node_id)
+            if current is None or current[0] is None or parent_id is None:
+                raise PatchError("move requires an existing non-root node and parent.")
+            parent_id = str(parent_id)
+            if self._node_row(conn, map_id, parent_id) is None:
+                raise PatchError("move requires an existing non-root node and parent.")
+            ancestors = conn.execute(
+                """
+                WITH RECURSIVE up(node_id, parent_id) AS (
+                    SELECT node_id, parent_id FROM nodes
+                    WHERE map_id = :map AND node_id = :parent AND valid_to IS NULL
+                    UNION
+                    SELECT n.node_id, n.parent_id FROM nodes n JOIN up ON n.node_id = up.parent_id
+                    WHERE n.map_id = :map AND n.valid_to IS NULL
+                )
+                SELECT 1 FROM up WHERE node_id = :node
+                """,
+                {"map": map_id, "parent": parent_id, "node": node_id},
+            ).fetchone()
+            if ancestors is not None:
+                raise PatchError("A node cannot be moved under its own descendant.")
+            node = _from_row(node_id, parent_id, current[2], current[3])
+            if "direction" in op:
+                node["direction"] = op["direction"]
+            position = current[1] if current[0] == parent_id else self._next_position(conn, map_id, parent_id)
+            self._put_node(conn, map_id, node_id, _to_row(node, position), new_version, current[4], current[2])
+            return 0
+
+        if kind == "delete":
+            node_id = str(op.get("id"))
+            current = self._node_row(conn, map_id, node_id)
+            if current is None:
+                # Already removed together with a deleted ancestor.
+                return 0
+            if current[0] is None:
+                raise PatchError("The root node cannot be deleted.")
+            doomed = [
+                r[0]
+                for r in conn.execute(
+                    """
+                    WITH RECURSIVE sub(node_id) AS (
+                        SELECT :node
+                        UNION ALL
+                        SELECT n.node_id FROM nodes n JOIN sub ON n.parent_id = sub.node_id
+                        WHERE n.map_id = :map AND n.valid_to IS NULL
+                    )
+                    SELECT node_id FROM sub
+                    """,
+                    {"map": map_id, "node": node_id},
+                )
+            ]
+            # Rows added in this same patch never existed in a committed version.
+            conn.executemany(
+                "DELETE FROM nodes WHERE map_id = ? AND node_id = ? AND valid_to IS NULL AND valid_from = ?",
+                [(map_id, d, new_version) for d in doomed],
+            )
+            conn.executemany(
+                "UPDATE nodes SET valid_to = ? WHERE map_id = ? AND node_id = ? AND valid_to IS NULL",
+                [(new_version, map_id, d) for d in doomed],
+            )
+            self._unindex_nodes(conn, map_id, doomed)
+            return -len(doomed)
+
+        raise PatchError(f"Unknown op: {kind!r}")
+
+    def delete_map(self, map_id: str) -> None:
+        with self._transaction() as conn:
+            self._map_version(conn, map_id)
+            for table, column in (("topic_grams", "map_id"), ("nodes", "map_id"), ("versions", "map_id"), ("maps", "id")):
+                conn.execute(f"DELETE FROM {table} WHERE {column} = ?", (map_id,))
+
+    def load_map(self, map_id: str, version: int | None = None) -> dict[str, Any]:
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            row = conn.execute("SELECT title, version, updated_at FROM maps WHERE id = ?", (map_id,)).fetchone()
+            if row is None:
+                raise MapNotFound(map_id)
+            title, current_version, saved_at = row
+            if version is None or version == current_version:
+                version = current_version
+                rows = conn.execute(
+                    "SELECT node_id, parent_id, topic, data FROM nodes "
+                    "WHERE map_id = ? AND valid_to IS NULL ORDER BY parent_id IS NOT NULL, parent_id, position",
+                    (map_id,),
+                ).fetchall()
+            else:
+                found = conn.execute(
+                    "SELECT saved_at FROM versions WHERE map_id = ? AND version = ?", (map_id, version)
+                ).fetchone()
+                if found is None:
+                    raise MapNotFound(f"{map_id}@{version}")
+                saved_at = found[0]
+                rows = conn.execute(
+                    "SELECT node_id, parent_id, topic, data FROM nodes "
+                    "WHERE map_id = ? AND valid_from <= ? AND (valid_to IS NULL OR valid_to > ?) "
+                    "ORDER BY parent_id IS NOT NULL, parent_id, position",
+                    (map_id, version, version),
+                ).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        return {
+            "id": map_id,
+            "title": title,
+            "version": version,
+            "savedAt": saved_at,
+            "nodes": [_from_row(*r) for r in rows],
+        }
+
+    def load_subtree(self, map_id: str, node_id: str, depth: int | None = None) -> list[dict[str, Any]]:
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM maps WHERE id = ?", (map_id,)).fetchone() is None:
+            raise MapNotFound(map_id)
+        rows = conn.execute(
+            """
+            WITH RECURSIVE sub(node_id, parent_id, topic, data, position, depth) AS (
+                SELECT node_id, parent_id, topic, data, position, 0 FROM nodes
+                WHERE map_id = :map AND node_id = :node AND valid_to IS NULL
+                UNION ALL
+                SELECT n.node_id, n.parent_id, n.topic, n.data, n.position, sub.depth + 1
+                FROM nodes n JOIN sub ON n.parent_id = sub.node_id
+                WHERE n.map_id = :map AND n.valid_to IS NULL AND sub.depth < :depth
+            )
+            SELECT node_id, parent_id, topic, data FROM sub ORDER BY depth, parent_id, position
+            """,
+            {"map": map_id, "node": node_id, "depth": _UNBOUNDED_DEPTH if depth is None else depth},
+        ).fetchall()
+        return [_from_row(*r) for r in rows]
+
+    def list_maps(self, limit: int = 20, cursor: str | None = None) -> tuple[list[dict[str, Any]], str | None]:
+        params: list[Any] = []
+        where = ""
+        if cursor:
+            updated_at, map_id = _decode_cursor(cursor)
+            where = "WHERE (updated_at, id) < (?, ?)"
+            params.extend([updated_at, map_id])
+        rows = self._conn().execute(
+            f"SELECT id, title, version, node_count, created_at, updated_at FROM maps {where} "
+            "ORDER BY updated_at DESC, id DESC LIMIT ?",
+            (*params, limit + 1),
+        ).fetchall()
+        maps = [
+            {"id": r[0], "title": r[1], "version": r[2], "nodeCount": r[3], "createdAt": r[4], "updatedAt": r[5]}
+            for r in rows[:limit]
+        ]
+        next_cursor = _encode_cursor(rows[limit - 1][5], rows[limit - 1][0]) if len(rows) > limit else None
+        return maps, next_cursor
+
+    def list_versions(self, map_id: str, limit: int = 20, before: int | None = None) -> list[dict[str, Any]]:
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM maps WHERE id = ?", (map_id,)).fetchone() is None:
+            raise MapNotFound(map_id)
+        rows = conn.execute(
+            "SELECT version, saved_at, node_count FROM versions WHERE map_id = ? AND version < ? "
+            "ORDER BY version DESC LIMIT ?",
+            (map_id, before if before is not None else 2**62, limit),
+        ).fetchall()
+        return [{"version": r[0], "savedAt": r[1], "nodeCount": r[2]} for r in rows]
+
+    def search(self, query: str, limit: int = 20) -> list[dict[str, Any]]:
+        """Returns nodes whose topic contains ``query``, best matches first."""
+        needle = normalize_text(query)
+        if not needle:
+            return []
+        # Every character of a longer query is covered by its bigrams.
+        grams = sorted(g for g in text_grams(query) if len(g) == 2 or len(needle) == 1)
+        conn = self._conn()
+        counts = {}
+        for gram in grams:
+            # A capped count is enough to tell rare grams from common ones.
+            counts[gram] = conn.execute(
+                "SELECT COUNT(*) FROM (SELECT 1 FROM topic_grams WHERE gram = ? LIMIT ?)",
+                (gram, _GRAM_COUNT_CAP),
+            ).fetchone()[0]
+            if counts[gram] == 0:
+                return []
+        # Walk the rarest gram's postings and probe the others by primary key.
+        rarest, *others = sorted(grams, key=lambda g: counts[g])
+        probes = "".join(
+            " AND EXISTS (SELECT 1 FROM topic_grams x WHERE x.gram = ? AND x.map_id = g.map_id AND x.node_id = g.node_id)"
+            for _ in others
+        )
+        candidates = conn.execute(
+            f"""
+            SELECT g.map_id, g.node_id, n.topic, n.parent_id, m.title, m.updated_at
+            FROM topic_grams g
+            JOIN nodes n ON n.map_id = g.map_id AND n.node_id = g.node_id AND n.valid_to IS NULL
+            JOIN maps m ON m.id = g.map_id
+            WHERE g.gram = ?{probes}
+            ORDER BY length(n.topic)
+            LIMIT ?
+            """,
+            (rarest, *others, _SEARCH_CANDIDATE_LIMIT),
+        ).fetchall()
+
+        hits = []
+        for map_id, node_id, topic, parent_id, title, updated_at in candidates:
+            normalized = normalize_text(topic)
+            position = normalized.find(needle)
+            if position < 0:
+                continue
+            score = len(needle) / max(len(normalized), 1)
+            if position == 0:
+                score += 0.5
+            if normalized == needle:
+                score += 1.0
+            hits.append((score, updated_at, map_id, node_id, topic, parent_id, title))
+        hits.sort(key=lambda h: (h[0], h[1]), reverse=True)
+
+        results = []
+        for score, _, map_id, node_id, topic, parent_id, title in hits[:limit]:
+            path = [
+                r[0]
+                for r in conn.execute(
+                    """
+                    WITH RECURSIVE up(node_id, parent_id, topic, depth) AS (
+                        SELECT node_id, parent_id, topic, 0 FROM nodes
+                        WHERE map_id = :map AND node_id = :parent AND valid_to IS NULL
+                        UNION ALL
+                        SELECT n.node_id, n.parent_id, n.topic, up.depth + 1
+                        FROM nodes n JOIN up ON n.node_id = up.parent_id
+                        WHERE n.map_id = :map AND n.valid_to IS NULL
+                    )
+                    SELECT topic FROM up ORDER BY depth DESC
+                    """,
+                    {"map": map_id, "parent": parent_id},
+                )
+            ] if parent_id is not None else []
+            results.append(
+                {
+                    "mapId": map_id,
+                    "mapTitle": title,
+                    "nodeId": node_id,
+                    "topic": topic,
+                    "path": path,
+                    "score": round(score, 4),
+                }
+            )
+        return results
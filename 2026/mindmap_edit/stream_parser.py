@@ -0,0 +1,111 @@
+"""Incremental JSON parsing for streamed model output."""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+Path = tuple[Any, ...]
+
+_WHITESPACE = " \t\r\n"
+
+
+class _Frame:
+    __slots__ = ("kind", "key", "index", "expect_key")
+
+    def __init__(self, kind: str) -> None:
+        self.kind = kind
+        self.key: str | None = None
+        self.index = -1
+        self.expect_key = kind == "object"
+
+
+class IncrementalJSONParser:
+    """Parses a JSON object fed in arbitrary chunks and reports string values.
+
+    ``feed`` returns ``(path, value)`` for every string value completed by the
+    chunk, where ``path`` is the tuple of keys and array indexes leading to it.
+    Text before the first ``{`` (such as a markdown fence) and anything after
+    the closing ``}`` is ignored. Numbers and literals are skipped.
+    """
+
+    def __init__(self) -> None:
+        self._stack: list[_Frame] = []
+        self._started = False
+        self.done = False
+        self._in_string = False
+        self._string_is_key = False
+        self._escape = False
+        self._buffer: list[str] = []
+        self._in_scalar = False
+
+    def _path(self) -> Path:
+        path: list[Any] = []
+        for frame in self._stack:
+            path.append(frame.key if frame.kind == "object" else frame.index)
+        return tuple(path)
+
+    def _begin_value(self) -> None:
+        if self._stack and self._stack[-1].kind == "array":
+            self._stack[-1].index += 1
+
+    def feed(self, chunk: str) -> list[tuple[Path, str]]:
+        events: list[tuple[Path, str]] = []
+        for ch in chunk:
+            if self.done:
+                break
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._stack.append(_Frame("object"))
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    self._buffer.append(ch)
+                elif ch == "\\":
+                    self._escape = True
+                    self._buffer.append(ch)
+                elif ch == '"':
+                    self._in_string = False
+                    value = json.loads('"' + "".join(self._buffer) + '"')
+                    self._buffer = []
+                    if self._string_is_key:
+                        self._stack[-1].key = value
+                    else:
+                        events.append((self._path(), value))
+                else:
+                    self._buffer.append(ch)
+                continue
+
+            if self._in_scalar:
+                if ch not in _WHITESPACE and ch not in ",]}":
+                    continue
+                self._in_scalar = False
+
+            if ch in _WHITESPACE:
+                continue
+            top = self._stack[-1]
+            if ch == '"':
+                self._in_string = True
+                self._string_is_key = top.kind == "object" and top.expect_key
+                if not self._string_is_key:
+                    self._begin_value()
+            elif ch == ":":
+                top.expect_key = False
+            elif ch == ",":
+                if top.kind == "object":
+                    top.expect_key = True
+                    top.key = None
+            elif ch in "{[":
+                self._begin_value()
+                self._stack.append(_Frame("object" if ch == "{" else "array"))
+            elif ch in "}]":
+                self._stack.pop()
+                if not self._stack:
+                    self.done = True
+            else:
+                self._begin_value()
+                self._in_scalar = True
+        return events
@@ -1,23 +1,43 @@
 from __future__ import annotations
 
+import functools
+import os
+import tempfile
 import textwrap
-import time
+from collections.abc import Iterator
+from contextlib import contextmanager
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 from flask import Flask, jsonify, render_template, request
-from moviepy import AudioFileClip, ImageClip
-from openai import OpenAI
 from PIL import Image, ImageDraw, ImageFont, ImageOps
 
+from httpcache import HTTPCache
+from metrics import Metrics
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
 APP_DIR = Path(__file__).parent
 STATIC_DIR = APP_DIR / "static"
 BG_IMAGE = APP_DIR / "background.png"
-TITLE_IMG = STATIC_DIR / "title.png"
-TTS_MP3 = STATIC_DIR / "speech.mp3"
 OUTPUT_MP4 = STATIC_DIR / "output.mp4"
+# Served under a fixed URL; the browser revalidates it by ETag instead of a ?v= query string.
+VIDEO_URL = "/static/output.mp4"
+
+SLOW_REQUEST_SECONDS = os.getenv("SLOW_REQUEST_SECONDS")
 
 app = Flask(__name__)
-client = OpenAI()
+metrics = Metrics(app, slow_request_seconds=float(SLOW_REQUEST_SECONDS) if SLOW_REQUEST_SECONDS else None)
+http_cache = HTTPCache(app)
+
+
+@functools.cache
+def get_client() -> OpenAI:
+    """Creates the OpenAI client on first use; importing ``openai`` is a large part of cold start."""
+    from openai import OpenAI
+
+    return OpenAI()
 
 
 FONT_CANDIDATES = [
@@ -36,6 +56,7 @@ def _load_font(size: int) -> ImageFont.FreeTypeFont | ImageFont.ImageFont:
     return ImageFont.load_default()
 
 
+@metrics.timed("create_title_image")
 def create_title_image(title: str, out_path: Path) -> None:
     width, height = 1280, 720
     if BG_IMAGE.exists():
@@ -96,8 +117,9 @@ def create_title_image(title: str, out_path: Path) -> None:
     img.save(out_path)
 
 
+@metrics.timed("generate_speech")
 def generate_speech(text: str, out_path: Path) -> None:
-    with client.audio.speech.with_streaming_response.create(
+    with get_client().audio.speech.with_streaming_response.create(
         model="gpt-4o-mini-tts",
         voice="coral",
         input=text,
@@ -105,27 +127,45 @@ def generate_speech(text: str, out_path: Path) -> None:
         response.stream_to_file(out_path)
 
 
+@metrics.timed("compose_video")
 def compose_video(image_path: Path, audio_path: Path, out_path: Path) -> None:
-    audio = AudioFileClip(str(audio_path))
-    clip = ImageClip(str(image_path)).with_duration(audio.duration).with_audio(audio)
-    clip.write_videofile(
-        str(out_path),
-        fps=24,
-        codec="libx264",
-        audio_codec="aac",
-        threads=2,
-        logger=None,
-    )
-    clip.close()
-    audio.close()
+    # moviepy pulls in numpy, imageio and ffmpeg discovery, so load it only when a video is rendered.
+    from moviepy import AudioFileClip, ImageClip
+
+    # Render next to the target under a name of its own and swap it in, so a viewer
+    # seeking with Range requests never reads a half-written file and concurrent
+    # requests never write to the same temporary file.
+    fd, tmp_name = tempfile.mkstemp(dir=out_path.parent, prefix=f".{out_path.stem}.", suffix=out_path.suffix)
+    os.close(fd)
+    try:
+        audio = AudioFileClip(str(audio_path))
+        clip = ImageClip(str(image_path)).with_duration(audio.duration).with_audio(audio)
+        clip.write_videofile(
+            tmp_name,
+            fps=24,
+            codec="libx264",
+            audio_codec="aac",
+            threads=2,
+            logger=None,
+        )
+        clip.close()
+        audio.close()
+        os.replace(tmp_name, out_path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+@contextmanager
+def render_workspace() -> Iterator[tuple[Path, Path]]:
+    """Title image and speech paths in a temporary directory private to one request."""
+    with tempfile.TemporaryDirectory(prefix="text-to-mp4-") as work:
+        yield Path(work) / "title.png", Path(work) / "speech.mp3"
 
 
 @app.route("/", methods=["GET"])
 def index():
-    video_url = None
-    if OUTPUT_MP4.exists():
-        video_url = f"/static/output.mp4?v={int(OUTPUT_MP4.stat().st_mtime)}"
-
+    video_url = VIDEO_URL if OUTPUT_MP4.exists() else None
     return render_template("index.html", video_url=video_url)
 
 
@@ -136,11 +176,11 @@ def generate():
     if not title or not text:
         return jsonify({"ok": False, "error": "タイトルとテキストを入力してください。"}), 400
 
-    create_title_image(title, TITLE_IMG)
-    generate_speech(text, TTS_MP3)
-    compose_video(TITLE_IMG, TTS_MP3, OUTPUT_MP4)
-    video_url = f"/static/output.mp4?v={int(time.time())}"
-    return jsonify({"ok": True, "video_url": video_url})
+    with render_workspace() as (title_img, speech_mp3):
+        create_title_image(title, title_img)
+        generate_speech(text, speech_mp3)
+        compose_video(title_img, speech_mp3, OUTPUT_MP4)
+    return jsonify({"ok": True, "video_url": VIDEO_URL})
 
 
 if __name__ == "__main__":
@@ -0,0 +1,95 @@
+"""ASGI entry point that synthesizes speech with ``AsyncOpenAI`` instead of blocking a thread.
+
+POST /generate is served here; every other route (the form, /static and
+/metrics) is the Flask app from ``app.py`` running in a WSGI thread pool (a2wsgi).
+
+    uvicorn asgi:app
+
+Speech requests share one semaphore (``UPSTREAM_CONCURRENCY``), give up after
+``SPEECH_TIMEOUT_SECONDS`` and are cancelled as soon as the client disconnects.
+The title image and the video are still rendered in worker threads.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+
+import app as video
+from asgi_helpers import Receive, Scope, Send, json_endpoint, lifespan
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+UPSTREAM_CONCURRENCY = int(os.getenv("UPSTREAM_CONCURRENCY", 16))
+SPEECH_TIMEOUT_SECONDS = float(os.getenv("SPEECH_TIMEOUT_SECONDS", 120))
+WSGI_THREADS = int(os.getenv("WSGI_THREADS", 10))
+
+upstream_slots = asyncio.Semaphore(UPSTREAM_CONCURRENCY)
+wsgi_app = WSGIMiddleware(video.app, workers=WSGI_THREADS)
+
+_async_client: AsyncOpenAI | None = None
+
+
+def get_async_client() -> AsyncOpenAI:
+    """Creates the client on the first speech request, so importing this module stays cheap."""
+    global _async_client
+    if _async_client is None:
+        from openai import AsyncOpenAI
+
+        _async_client = AsyncOpenAI()
+    return _async_client
+
+
+async def generate_speech(text: str, out_path: Path) -> None:
+    async def call() -> None:
+        async with upstream_slots:
+            with video.metrics.stage("generate_speech"):
+                async with get_async_client().audio.speech.with_streaming_response.create(
+                    model="gpt-4o-mini-tts",
+                    voice="coral",
+                    input=text,
+                ) as response:
+                    await response.stream_to_file(out_path)
+
+    await asyncio.wait_for(call(), SPEECH_TIMEOUT_SECONDS)
+
+
+async def generate(form: dict[str, list[str]]) -> tuple[int, dict[str, Any]]:
+    title = form.get("title", [""])[0].strip()
+    text = form.get("text", [""])[0].strip()
+    if not title or not text:
+        return 400, {"ok": False, "error": "タイトルとテキストを入力してください。"}
+
+    with video.render_workspace() as (title_img, speech_mp3):
+        await asyncio.to_thread(video.create_title_image, title, title_img)
+        try:
+            await generate_speech(text, speech_mp3)
+        except asyncio.TimeoutError:
+            return 504, {"ok": False, "error": "音声の生成がタイムアウトしました。"}
+        await asyncio.to_thread(video.compose_video, title_img, speech_mp3, video.OUTPUT_MP4)
+    return 200, {"ok": True, "video_url": video.VIDEO_URL}
+
+
+async def _generate(body: bytes) -> tuple[int, dict[str, Any]]:
+    return await generate(parse_qs(body.decode("utf-8", errors="replace")))
+
+
+async def _close_client() -> None:
+    if _async_client is not None:
+        await _async_client.close()
+
+
+async def app(scope: Scope, receive: Receive, send: Send) -> None:
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send, _close_client)
+        return
+    if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] == "/generate":
+        await json_endpoint(video.metrics, "POST", "/generate", _generate, receive, send)
+        return
+    await wsgi_app(scope, receive, send)
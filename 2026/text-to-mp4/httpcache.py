@@ -0,0 +1,109 @@
+"""Response compression and conditional caching (ETag / 304 / Range) for the Flask apps."""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+
+from flask import Flask, Response, request
+
+try:
+    import brotli
+except ImportError:  # optional: ``pip install brotli`` enables ``Content-Encoding: br``
+    brotli = None
+
+COMPRESSIBLE_TYPES = frozenset(
+    {
+        "application/json",
+        "text/html",
+        "text/plain",
+    }
+)
+MEDIA_TYPE_PREFIXES = ("video/", "audio/", "image/")
+
+
+class HTTPCache:
+    """Adds strong ETags, 304 responses and gzip/brotli compression to buffered responses.
+
+    GET/HEAD responses with a compressible type get an ETag derived from the body and
+    ``Cache-Control: no-cache``, so the browser revalidates on every load and receives an
+    empty 304 while nothing changed. The ETag carries the content coding, so the gzip,
+    brotli and identity variants never share a validator.
+
+    Files sent with ``send_file`` (including ``/static``) are passed through uncompressed;
+    they already answer ``Range`` and ``If-None-Match`` from their mtime and size, and
+    media types among them are marked ``no-cache`` (or cached for ``media_max_age``
+    seconds) so a file that is regenerated under the same URL is revalidated instead of
+    being served stale. Streamed responses such as Server-Sent Events are left untouched.
+    """
+
+    def __init__(
+        self,
+        app: Flask | None = None,
+        *,
+        min_size: int = 512,
+        gzip_level: int = 6,
+        brotli_quality: int = 5,
+        media_max_age: int = 0,
+    ) -> None:
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.media_max_age = media_max_age
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        app.after_request(self._after_request)
+
+    def _choose_encoding(self, size: int) -> str | None:
+        if size < self.min_size:
+            return None
+        accepted = request.accept_encodings
+        if brotli is not None and accepted["br"]:
+            return "br"
+        if accepted["gzip"]:
+            return "gzip"
+        return None
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    def _cache_media(self, response: Response) -> Response:
+        if self.media_max_age > 0:
+            response.cache_control.no_cache = None
+            response.cache_control.max_age = self.media_max_age
+        else:
+            response.cache_control.no_cache = True
+        response.accept_ranges = "bytes"
+        return response
+
+    def _after_request(self, response: Response) -> Response:
+        if response.direct_passthrough:
+            # send_file: conditional requests and ranges are handled by Werkzeug.
+            if response.mimetype.startswith(MEDIA_TYPE_PREFIXES):
+                return self._cache_media(response)
+            return response
+        if response.is_streamed or response.mimetype not in COMPRESSIBLE_TYPES:
+            return response
+        if "Content-Encoding" in response.headers:
+            return response
+
+        body = response.get_data()
+        encoding = self._choose_encoding(len(body))
+        response.vary.add("Accept-Encoding")
+        if request.method in ("GET", "HEAD") and response.status_code == 200:
+            if "Cache-Control" not in response.headers:
+                response.cache_control.no_cache = True
+            digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+            response.set_etag(f"{digest}-{encoding}" if encoding else digest)
+            response.make_conditional(request)
+            if response.status_code == 304:
+                return response
+
+        if encoding is not None:
+            response.set_data(self._compress(body, encoding))
+            response.headers["Content-Encoding"] = encoding
+        return response
@@ -0,0 +1,206 @@
+"""Per-route and per-stage timing exposed on /metrics in Prometheus text format."""
+
+from __future__ import annotations
+
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+from flask import Flask, Response, g, has_request_context, request
+
+# Per-request stage list for requests recorded with ``track_request`` (outside Flask).
+# Tasks and ``asyncio.to_thread`` calls copy the context, so their stages land here too.
+_request_stages: contextvars.ContextVar[list[tuple[str, float]] | None] = contextvars.ContextVar(
+    "metrics_request_stages", default=None
+)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs: dict[str, str]) -> str:
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in pairs.items())
+
+
+class Metrics:
+    """Collects request latency, in-flight counts and pipeline stage timings.
+
+    Wrap pipeline steps with ``metrics.stage("name")`` or ``@metrics.timed("name")``.
+    When ``slow_request_seconds`` is set, requests slower than that are logged
+    together with the time spent in each stage.
+    """
+
+    def __init__(
+        self,
+        app: Flask | None = None,
+        *,
+        slow_request_seconds: float | None = None,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.slow_request_seconds = slow_request_seconds
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._requests: dict[tuple[str, str], Histogram] = {}
+        self._statuses: dict[tuple[str, str, str], int] = {}
+        self._in_flight: dict[tuple[str, str], int] = {}
+        self._stages: dict[str, Histogram] = {}
+        self._app: Flask | None = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        self._app = app
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule("/metrics", "metrics", self._metrics_view, methods=["GET"])
+
+    @staticmethod
+    def _route_key() -> tuple[str, str]:
+        rule = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+        return request.method, rule
+
+    def _enter(self, key: tuple[str, str]) -> None:
+        with self._lock:
+            self._in_flight[key] = self._in_flight.get(key, 0) + 1
+
+    def _leave(self, key: tuple[str, str], status: str, elapsed: float, stages: list[tuple[str, float]]) -> None:
+        with self._lock:
+            self._in_flight[key] -= 1
+            hist = self._requests.get(key)
+            if hist is None:
+                hist = self._requests[key] = Histogram(self.buckets)
+            hist.observe(elapsed)
+            status_key = (key[0], key[1], status)
+            self._statuses[status_key] = self._statuses.get(status_key, 0) + 1
+
+        if self.slow_request_seconds is not None and elapsed >= self.slow_request_seconds and self._app:
+            breakdown = ", ".join(f"{name}={seconds:.3f}s" for name, seconds in stages) or "-"
+            self._app.logger.warning(
+                "slow request %s %s status=%s took %.3fs stages: %s",
+                key[0], key[1], status, elapsed, breakdown,
+            )
+
+    @contextmanager
+    def track_request(self, method: str, route: str) -> Iterator[dict[str, Any]]:
+        """Records a request handled outside Flask (for example by the ASGI entry point).
+
+        Set ``"status"`` on the yielded dict. Stages observed inside the block, including
+        in tasks and threads started from it, are collected in ``"stages"`` for the slow log.
+        """
+        key = (method, route)
+        state: dict[str, Any] = {"status": "500", "stages": []}
+        start = time.perf_counter()
+        token = _request_stages.set(state["stages"])
+        self._enter(key)
+        try:
+            yield state
+        finally:
+            _request_stages.reset(token)
+            self._leave(key, str(state["status"]), time.perf_counter() - start, state["stages"])
+
+    def _before_request(self) -> None:
+        key = self._route_key()
+        g._metrics_start = time.perf_counter()
+        g._metrics_key = key
+        g._metrics_stages = []
+        self._enter(key)
+
+    def _after_request(self, response: Response) -> Response:
+        g._metrics_status = str(response.status_code)
+        return response
+
+    def _teardown_request(self, exc: BaseException | None) -> None:
+        start = g.pop("_metrics_start", None)
+        key = g.pop("_metrics_key", None)
+        if start is None or key is None:
+            return
+        elapsed = time.perf_counter() - start
+        self._leave(key, g.pop("_metrics_status", "500"), elapsed, g.pop("_metrics_stages", []))
+
+    def observe_stage(self, name: str, seconds: float) -> None:
+        with self._lock:
+            hist = self._stages.get(name)
+            if hist is None:
+                hist = self._stages[name] = Histogram(self.buckets)
+            hist.observe(seconds)
+        stages = g.get("_metrics_stages") if has_request_context() else _request_stages.get()
+        if stages is not None:
+            stages.append((name, seconds))
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(name, time.perf_counter() - start)
+
+    def timed(self, name: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+        def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+            @functools.wraps(func)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                with self.stage(name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def _render_histogram(self, lines: list[str], metric: str, labels: dict[str, str], hist: Histogram) -> None:
+        for bound, count in zip(hist.buckets, hist.counts):
+            lines.append(f"{metric}_bucket{{{_labels({**labels, 'le': repr(float(bound))})}}} {count}")
+        lines.append(f"{metric}_bucket{{{_labels({**labels, 'le': '+Inf'})}}} {hist.count}")
+        lines.append(f"{metric}_sum{{{_labels(labels)}}} {hist.total}")
+        lines.append(f"{metric}_count{{{_labels(labels)}}} {hist.count}")
+
+    def render(self) -> str:
+        lines: list[str] = []
+        with self._lock:
+            lines.append("# HELP http_request_duration_seconds Request latency by route.")
+            lines.append("# TYPE http_request_duration_seconds histogram")
+            for (method, route), hist in sorted(self._requests.items()):
+                self._render_histogram(
+                    lines, "http_request_duration_seconds", {"method": method, "route": route}, hist
+                )
+
+            lines.append("# HELP http_requests_total Completed requests by route and status.")
+            lines.append("# TYPE http_requests_total counter")
+            for (method, route, status), count in sorted(self._statuses.items()):
+                labels = _labels({"method": method, "route": route, "status": status})
+                lines.append(f"http_requests_total{{{labels}}} {count}")
+
+            lines.append("# HELP http_requests_in_flight Requests currently being handled by route.")
+            lines.append("# TYPE http_requests_in_flight gauge")
+            for (method, route), count in sorted(self._in_flight.items()):
+                lines.append(f"http_requests_in_flight{{{_labels({'method': method, 'route': route})}}} {count}")
+
+            lines.append("# HELP pipeline_stage_duration_seconds Time spent in each pipeline stage.")
+            lines.append("# TYPE pipeline_stage_duration_seconds histogram")
+            for name, hist in sorted(self._stages.items()):
+                self._render_histogram(lines, "pipeline_stage_duration_seconds", {"stage": name}, hist)
+        return "\n".join(lines) + "\n"
+
+    def _metrics_view(self) -> Response:
+        return Response(self.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")